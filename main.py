@@ -4,6 +4,9 @@ import configparser
 import scripts.assets as Assets
 import scripts.renderer as Renderer
 import scripts.game_logic as GameLogic
+import scripts.history as History
+import scripts.recorder as Recorder
+import scripts.telemetry as Telemetry
 
 
 
@@ -11,8 +14,9 @@ def read_config() -> None:
     '''Reads the configuration file'''
     config = configparser.ConfigParser()
     config.read('config.ini')
-    global GAME_FPS, TPACK, GRID_SIZE, CELL_SIZE, GRID_MARGIN, SCORE_OBJECTIVES, MAX_RAINBOW_CELLS, MAX_CROSS_CELLS
+    global GAME_FPS, WORKER_THREADS, TPACK, GRID_SIZE, CELL_SIZE, GRID_MARGIN, WINDOW_SIZE, RENDER_SCALE, SMOOTH_SCALING, SCORE_OBJECTIVES, SPAWN_WEIGHTS, OBJECTIVE_BIAS, MAX_RAINBOW_CELLS, MAX_CROSS_CELLS, UNDO_MEMORY_BUDGET, RECORDER, TELEMETRY
     GAME_FPS = config.getint('general', 'frames_per_second')
+    WORKER_THREADS = config.getint('general', 'worker_threads')
     try:
         TPACK = Assets.TexturePack(f'assets/{config.get('general', 'texture_pack')}')
     except FileNotFoundError:
@@ -23,11 +27,47 @@ def read_config() -> None:
     )
     CELL_SIZE = config.getint('graphics', 'cell_size')
     GRID_MARGIN = config.getint('graphics', 'grid_margin')
+    WINDOW_SIZE = (
+        GRID_MARGIN * 2 + CELL_SIZE * GRID_SIZE[0],
+        GRID_MARGIN * 2 + CELL_SIZE * GRID_SIZE[1] + CELL_SIZE
+    )
+    # The game is rendered at a lower resolution when render_scale is below 1, then scaled to the window
+    RENDER_SCALE = config.getfloat('graphics', 'render_scale')
+    SMOOTH_SCALING = config.getboolean('graphics', 'smooth_scaling')
+    CELL_SIZE = max(1, round(CELL_SIZE * RENDER_SCALE))
+    GRID_MARGIN = round(GRID_MARGIN * RENDER_SCALE)
     SCORE_OBJECTIVES = []
     for i in ['red_cells', 'green_cells', 'blue_cells', 'yellow_cells', 'purple_cells', 'pink_cells']:
         SCORE_OBJECTIVES.append(config.getint('game-objectives', i))
+    SPAWN_WEIGHTS = []
+    for i in ['red_cells', 'green_cells', 'blue_cells', 'yellow_cells', 'purple_cells', 'pink_cells']:
+        SPAWN_WEIGHTS.append(config.getfloat('game-spawn-weights', i))
+    # With fewer than 4 types of cells, the starting grid can hardly or never be generated without any alignment
+    if any(weight < 0 for weight in SPAWN_WEIGHTS) or sum(weight > 0 for weight in SPAWN_WEIGHTS) < 4:
+        raise ValueError(f'Invalid spawn weights: {SPAWN_WEIGHTS}, they cannot be negative and at least 4 of them must be positive')
+    OBJECTIVE_BIAS = config.getfloat('game', 'objective_bias')
     MAX_RAINBOW_CELLS = config.getint('game', 'max_rainbow_cells')
     MAX_CROSS_CELLS = config.getint('game', 'max_cross_cells')
+    UNDO_MEMORY_BUDGET = config.getint('game', 'undo_memory_budget') * 1024 * 1024
+    RECORDER = None
+    if config.getboolean('recording', 'enabled', fallback=False):
+        RECORDER = Recorder.FrameRecorder(
+            directory=config.get('recording', 'directory'),
+            output_format=config.get('recording', 'format'),
+            queue_size=config.getint('recording', 'queue_size')
+        )
+    TELEMETRY = None
+    if config.getboolean('telemetry', 'enabled', fallback=False):
+        # The statistics are aggregated per configuration of the rules
+        config_id = f'{GRID_SIZE[0]}x{GRID_SIZE[1]} objectives={",".join(map(str, SCORE_OBJECTIVES))} ' \
+            f'spawn_weights={",".join(map(str, SPAWN_WEIGHTS))} objective_bias={OBJECTIVE_BIAS} ' \
+            f'max_rainbow_cells={MAX_RAINBOW_CELLS} max_cross_cells={MAX_CROSS_CELLS}'
+        TELEMETRY = Telemetry.SessionTelemetry(
+            directory=config.get('telemetry', 'directory'),
+            config_id=config_id,
+            cells=[name for name, _ in TPACK.CELL_TEXTURES[:-2]],
+            max_file_size=config.getint('telemetry', 'max_file_size') * 1024 * 1024
+        )
 
     
 # Initialize the game
@@ -40,19 +80,19 @@ screen_size = (
     GRID_MARGIN * 2 + CELL_SIZE * GRID_SIZE[1] + CELL_SIZE
 )
 
-cells = Renderer.resize_cells(TPACK.CELLS, CELL_SIZE)
-rainbow_cell, cross_cell = Renderer.resize_cells([
-    ('rainbow', TPACK.RAINBOW_CELL),
-    ('cross', TPACK.CROSS_CELL)
-], CELL_SIZE)
+cells, rainbow_cell, cross_cell = TPACK.scaled_cells(CELL_SIZE)
 rainbow_cells_nb = 0
 cross_cells_nb = 0
 
-screen = pygame.display.set_mode(screen_size)
+display = Renderer.Display(screen_size, WINDOW_SIZE, SMOOTH_SCALING)
+screen = display.backbuffer
+background = pygame.transform.scale(TPACK.BACKGROUND_IMAGE, screen_size)
 pygame.display.set_caption('Candy Game')
 animation_manager = Renderer.AnimationManager()
 score_manager = GameLogic.ScoreManager(cells, SCORE_OBJECTIVES)
 selector = (None, None)
+history = History.History(UNDO_MEMORY_BUDGET)
+record_history = True # The state is recorded once the grid is stable
 
 
 grid = GameLogic.generate_grid(*GRID_SIZE)
@@ -63,11 +103,12 @@ animation_manager.add_animations(Renderer.LinearAnimation.from_movements(
             cells=cells,
             rainbow_cell=rainbow_cell,
             cross_cell=cross_cell,
+            weights=SPAWN_WEIGHTS
         )
     ),
     cell_size=CELL_SIZE,
     grid_margin=(GRID_MARGIN, GRID_MARGIN+CELL_SIZE),
-    speed=1000,
+    speed=1000 * RENDER_SCALE,
     delay=0.01
 ))
 
@@ -83,8 +124,20 @@ while running:
         if event.type == pygame.QUIT:
             running = False
 
+        # Only undo or redo once the grid is stable: can_play is still true during the frame
+        # that follows a cascade step, while the refilled cells are in flight
+        elif event.type == pygame.KEYDOWN and can_play and not record_history and event.mod & pygame.KMOD_CTRL:
+            state = None
+            if event.key == pygame.K_z and not event.mod & pygame.KMOD_SHIFT:
+                state = history.undo()
+            elif event.key == pygame.K_y or event.key == pygame.K_z:
+                state = history.redo()
+            if state is not None:
+                grid, score_manager.scores, rainbow_cells_nb, cross_cells_nb = state
+                selector = (None, None)
+
         elif event.type == pygame.MOUSEBUTTONDOWN:
-            mouse_x, mouse_y = event.pos
+            mouse_x, mouse_y = display.to_logical(event.pos)
             x = (mouse_x - GRID_MARGIN) // CELL_SIZE
             y = (mouse_y - GRID_MARGIN - CELL_SIZE) // CELL_SIZE
             if x >= 0 and x < GRID_SIZE[0] and y >= 0 and y < GRID_SIZE[1]:
@@ -114,6 +167,8 @@ while running:
                             )
                             score_manager.update_score_from_dict(aligned_cells)
                             rainbow_cells_nb -= 1
+                            if TELEMETRY:
+                                TELEMETRY.start_move(selector, (x, y), 'rainbow', aligned_cells)
                         
                         # Check if this is an interaction with a cross cell
                         elif (grid[y][x][0] == 'cross' or grid[selector[1]][selector[0]][0] == 'cross'):
@@ -133,16 +188,21 @@ while running:
                             )
                             score_manager.update_score_from_dict(aligned_cells)
                             cross_cells_nb -= 1
+                            if TELEMETRY:
+                                TELEMETRY.start_move(selector, (x, y), 'cross', aligned_cells)
                         
                             
                         # Otherwise, swap the two selected cells
                         else: 
                             animation_manager.add_animations(Renderer.LinearAnimation.from_movements(
                                 [(x, y, selector[0], selector[1], grid[y][x]), (selector[0], selector[1], x, y, grid[selector[1]][selector[0]])],
-                                CELL_SIZE, (GRID_MARGIN, GRID_MARGIN+CELL_SIZE), speed=500
+                                CELL_SIZE, (GRID_MARGIN, GRID_MARGIN+CELL_SIZE), speed=500 * RENDER_SCALE
                             ))
                             grid[y][x], grid[selector[1]][selector[0]] = (None, None), (None, None)
+                            if TELEMETRY:
+                                TELEMETRY.start_move(selector, (x, y), 'swap')
                         selector = (None, None)
+                        record_history = True
 
                         
                     else:
@@ -151,9 +211,7 @@ while running:
                 selector = (x, y)
 
     # Fill the background with assets.BACKGROUND_IMAGE
-    screen.blit(
-        pygame.transform.scale(TPACK.BACKGROUND_IMAGE, screen_size), (0, 0)
-    )
+    screen.blit(background, (0, 0))
 
     Renderer.render_grid(
         screen=screen, 
@@ -184,6 +242,8 @@ while running:
 
     has_won = score_manager.check_completion()
     can_play = animation_manager.is_done and not has_won
+    if has_won and TELEMETRY:
+        TELEMETRY.win()
 
 
     if not can_play: # If the animations are not done, we can't play
@@ -196,19 +256,41 @@ while running:
             rainbow_cell=rainbow_cell,
             cross_cell=cross_cell,
             add_rainbow_cells= True if rainbow_cells_nb < MAX_RAINBOW_CELLS else False,
-            add_cross_cells= True if cross_cells_nb < MAX_CROSS_CELLS else False
+            add_cross_cells= True if cross_cells_nb < MAX_CROSS_CELLS else False,
+            workers=WORKER_THREADS
         )
         rainbow_cells_nb += rainbow_cells
         cross_cells_nb += cross_cells
         score_manager.update_score_from_dict(aligned_cells)
-        movements, grid = GameLogic.fill_grid(grid, cells)
-        animation_manager.add_animations(Renderer.LinearAnimation.from_movements(movements, CELL_SIZE, (GRID_MARGIN, GRID_MARGIN+CELL_SIZE), speed=1000, delay=0.01))
+        if TELEMETRY:
+            TELEMETRY.add_cascade(aligned_cells, rainbow_cells, cross_cells)
+        movements, grid = GameLogic.fill_grid(
+            grid, cells, WORKER_THREADS, score_manager.spawn_weights(SPAWN_WEIGHTS, OBJECTIVE_BIAS)
+        )
+        animation_manager.add_animations(Renderer.LinearAnimation.from_movements(movements, CELL_SIZE, (GRID_MARGIN, GRID_MARGIN+CELL_SIZE), speed=1000 * RENDER_SCALE, delay=0.01))
+
+        # Record the state once the move is over
+        if record_history and not aligned_cells and not movements:
+            history.push(grid, score_manager.scores, rainbow_cells_nb, cross_cells_nb)
+            record_history = False
+            if TELEMETRY:
+                TELEMETRY.end_move()
 
 
     if selector != (None, None):
         Renderer.render_selector(screen, selector, TPACK, CELL_SIZE, GRID_SIZE, (GRID_MARGIN, GRID_MARGIN+CELL_SIZE))
 
 
-    # Update the display
-    pygame.display.flip()
-    clock.tick(GAME_FPS)
+    # Scale the backbuffer to the window and update the display
+    display.present()
+    if RECORDER:
+        RECORDER.capture(screen)
+    frame_time = clock.tick(GAME_FPS)
+    if TELEMETRY:
+        TELEMETRY.add_frame(frame_time)
+
+
+if RECORDER:
+    RECORDER.close()
+if TELEMETRY:
+    TELEMETRY.close()
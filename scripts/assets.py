@@ -1,3 +1,6 @@
+import json
+import os
+
 import pygame
 
 
@@ -26,6 +29,7 @@ class TexturePack:
     GREEN_CELL: pygame.Surface
     BLUE_CELL: pygame.Surface
     YELLOW_CELL: pygame.Surface
+    PURPLE_CELL: pygame.Surface
     PINK_CELL: pygame.Surface
 
     PATHS = {
@@ -41,28 +45,112 @@ class TexturePack:
         'PINK_CELL': 'cells/pink_cell.png'
     }
 
+    CELL_TEXTURES = [
+        ('red', 'RED_CELL'),
+        ('green', 'GREEN_CELL'),
+        ('blue', 'BLUE_CELL'),
+        ('yellow', 'YELLOW_CELL'),
+        ('purple', 'PURPLE_CELL'),
+        ('pink', 'PINK_CELL'),
+        ('rainbow', 'RAINBOW_CELL'),
+        ('cross', 'CROSS_CELL')
+    ]
+
     def __init__(self, path: str) -> None:
-        '''Initializes the texture pack
+        '''Initializes the texture pack, the textures are only loaded the first time they are used
 
         :param str path: the path to the texture pack
         '''
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f'Texture pack not found: {path}')
         self.path = path
-        for texture, file_path in self.PATHS.items():
-            self.__dict__[texture] = pygame.image.load(f'{self.path}/{file_path}')
 
         self.SELECTOR = SELECTOR
         self.SUBSELECTOR = SUBSELECTOR
         self.CELL_BACKGROUND = CELL_BACKGROUND
         self.SCORE_CELL_BACKGROUND = SCORE_CELL_BACKGROUND
+        self.scaled_interfaces: dict[int, dict[str, pygame.Surface]] = {}
+
+
+    def __getattr__(self, name: str) -> pygame.Surface:
+        '''Loads a texture the first time it is accessed
+
+        :param str name: the name of the texture
+        :return pygame.Surface: the texture
+        '''
+        if name not in self.PATHS:
+            raise AttributeError(f'{type(self).__name__} has no attribute {name}')
+        self.__dict__[name] = pygame.image.load(f'{self.path}/{self.PATHS[name]}')
+        return self.__dict__[name]
+
 
-        self.CELLS = [
-            ('red', self.RED_CELL),
-            ('green', self.GREEN_CELL),
-            ('blue', self.BLUE_CELL),
-            ('yellow', self.YELLOW_CELL),
-            ('purple', self.PURPLE_CELL),
-            ('pink', self.PINK_CELL)
-        ]
+    @property
+    def CELLS(self) -> list[tuple[str, pygame.Surface]]:
+        '''Returns the normal cells, as (name, texture)
+
+        :return list[tuple[str, pygame.Surface]]:
+        '''
+        return [(name, getattr(self, texture)) for name, texture in self.CELL_TEXTURES[:-2]]
+
+
+    def scaled_cells(self, cell_size: int, cache_directory: str = '.texture_cache') -> tuple[list[tuple[str, pygame.Surface]], tuple[str, pygame.Surface], tuple[str, pygame.Surface]]:
+        '''Returns the cells scaled to a size, from a cache on the disk when it is up to date
+        The cache is identified by the texture pack, the size and the modification time of the textures,
+        so a cache hit does not decode any image
+
+        :param int cell_size: the size of a cell, in pixels
+        :param str cache_directory: the directory of the cache
+        :return tuple[list[tuple[str, pygame.Surface]], tuple[str, pygame.Surface], tuple[str, pygame.Surface]]: the normal cells, the rainbow cell and the cross cell
+        '''
+        key = ':'.join([os.path.abspath(self.path), str(cell_size)] + [
+            str(os.stat(f'{self.path}/{self.PATHS[texture]}').st_mtime_ns) for _, texture in self.CELL_TEXTURES
+        ])
+        cache_path = os.path.join(cache_directory, f'{os.path.basename(os.path.normpath(self.path))}_{cell_size}.bin')
+
+        cells = None
+        try:
+            with open(cache_path, 'rb') as file:
+                data = file.read()
+            header, pixels = data.split(b'\n', 1)
+            if json.loads(header)['key'] == key:
+                sprite_size = cell_size * cell_size * 4
+                cells = [
+                    (name, pygame.image.frombytes(pixels[i * sprite_size:(i + 1) * sprite_size], (cell_size, cell_size), 'RGBA'))
+                    for i, (name, _) in enumerate(self.CELL_TEXTURES)
+                ]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        if cells is None:
+            cells = [
+                (name, pygame.transform.scale(getattr(self, texture), (cell_size, cell_size)))
+                for name, texture in self.CELL_TEXTURES
+            ]
+            try:
+                os.makedirs(cache_directory, exist_ok=True)
+                with open(f'{cache_path}.{os.getpid()}.tmp', 'wb') as file:
+                    file.write(json.dumps({'key': key}).encode() + b'\n')
+                    for _, sprite in cells:
+                        file.write(pygame.image.tobytes(sprite, 'RGBA'))
+                os.replace(f'{cache_path}.{os.getpid()}.tmp', cache_path)
+            except OSError:
+                pass # The cache is only an optimization
+
+        return cells[:-2], cells[-2], cells[-1]
+
+
+    def scaled_interface(self, cell_size: int) -> dict[str, pygame.Surface]:
+        '''Returns the textures of the interface scaled to the size of a cell, they are only scaled the first time
+
+        :param int cell_size: the size of a cell, in pixels
+        :return dict[str, pygame.Surface]: the textures, by name
+        '''
+        if cell_size not in self.scaled_interfaces:
+            self.scaled_interfaces[cell_size] = {
+                name: pygame.transform.scale(getattr(self, name), (cell_size, cell_size))
+                for name in ['CELL_BACKGROUND', 'SCORE_CELL_BACKGROUND', 'CHECKMARK_ICON', 'SELECTOR', 'SUBSELECTOR']
+            }
+        return self.scaled_interfaces[cell_size]
 
 
 
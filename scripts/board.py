@@ -0,0 +1,351 @@
+import random
+from functools import lru_cache
+from itertools import groupby
+
+import numpy
+
+from scripts.game_logic import G, C
+import scripts.game_logic as game_logic
+from scripts.patterns import PatternSet, DEFAULT_PATTERNS, DIRECTIONS, EMPTY, CROSS, RAINBOW
+import scripts.tiling as tiling
+
+
+
+# A compact board is a flat bytearray of cell codes, in row-major order (index = y * w + x).
+# Copying one is a single memory copy, unlike copy_grid which rebuilds every row.
+B = bytearray # Type alias for the compact board
+
+# Up to this number of cells, like the boards of the bot, the runs of the default rules are scanned in Python,
+# above it numpy matches the patterns in a few passes over the whole board
+SCAN_MAX_CELLS = 1024
+
+
+def encode_grid(g: G, cells: list[C]) -> B:
+    '''Converts a grid to a compact board
+
+    :param G g: the grid to convert
+    :param list[C] cells: the list of normal cell types, their index defines their code
+    :return B: the compact board
+    '''
+    return bytearray(game_logic.grid_codes(g, cells).tobytes())
+
+
+def decode_board(board: B, w: int, cells: list[C], rainbow_cell: C, cross_cell: C) -> G:
+    '''Converts a compact board back to a grid
+
+    :param B board: the board to convert
+    :param int w: the width of the board
+    :param list[C] cells: the list of normal cell types, in the order used to encode the board
+    :param C rainbow_cell: the rainbow cell type
+    :param C cross_cell: the cross cell type
+    :return G: the grid
+    '''
+    cell_types = [(None, None)] + cells + [(None, None)] * (CROSS - len(cells) - 1) + [cross_cell, rainbow_cell]
+    return [[cell_types[code] for code in board[y:y + w]] for y in range(0, len(board), w)]
+
+
+def is_normal(code: int) -> bool:
+    '''Returns True if the code is the one of a normal cell
+
+    :param int code: the code of the cell
+    :return bool:
+    '''
+    return code != EMPTY and code < CROSS
+
+
+def is_aligned(board: B, w: int, h: int, i: int, patterns: PatternSet = None) -> bool:
+    '''Checks if the cell at index i is part of a match, by only looking at the cells around it
+
+    :param B board: the board to check
+    :param int w: the width of the board
+    :param int h: the height of the board
+    :param int i: the index of the cell
+    :param PatternSet patterns: the match patterns, if None the runs of the default rules are scanned directly,
+        which is much faster than matching the patterns on such a small window
+    :return bool:
+    '''
+    code = board[i]
+    if not is_normal(code):
+        return False
+    x, y = i % w, i // w
+    if patterns is None:
+        for dx, dy in DIRECTIONS:
+            n = 1
+            for sign in (1, -1):
+                nx, ny = x + dx * sign, y + dy * sign
+                while 0 <= nx < w and 0 <= ny < h and board[ny * w + nx] == code:
+                    n += 1
+                    nx, ny = nx + dx * sign, ny + dy * sign
+            if n >= 3:
+                return True
+        return False
+
+    # The matches containing the cell only depend on the cells within the halo of the patterns
+    left, top = max(x - patterns.halo, 0), max(y - patterns.halo, 0)
+    right, bottom = min(x + patterns.halo + 1, w), min(y + patterns.halo + 1, h)
+    codes = numpy.frombuffer(board, numpy.uint8).reshape(h, w)[top:bottom, left:right]
+    aligned, _ = patterns.match(codes)
+    return bool(aligned[y - top, x - left])
+
+
+def find_alignments(board: B, w: int, h: int, rng: random.Random = None, patterns: PatternSet = None) -> tuple[set[int], set[int], set[int]]:
+    '''Finds all the aligned cells of the board, following the rules of game_logic.detect_alignments
+
+    :param B board: the board to check
+    :param int w: the width of the board
+    :param int h: the height of the board
+    :param random.Random rng: the generator used to place the special cells, if None they are placed on the first cell of their pattern
+    :param PatternSet patterns: the match patterns, if None the default ones, scanned as runs on small boards (see find_runs)
+    :return tuple[set[int], set[int], set[int]]:
+        - the indexes of the aligned cells
+        - the indexes where rainbow cells spawn
+        - the indexes where cross cells spawn
+    '''
+    if patterns is None and w * h <= SCAN_MAX_CELLS:
+        return find_runs(board, w, h, rng)
+
+    codes = numpy.frombuffer(board, numpy.uint8).reshape(h, w)
+    aligned, spawns = (patterns or DEFAULT_PATTERNS).match(codes, numpy.random.default_rng(rng.getrandbits(64)) if rng else None)
+    special_cells = {'rainbow': set(), 'cross': set()}
+    for name, indexes in spawns:
+        if name in special_cells:
+            special_cells[name].update(indexes.tolist())
+    return set(numpy.flatnonzero(aligned).tolist()), special_cells['rainbow'], special_cells['cross']
+
+
+@lru_cache
+def board_lines(w: int, h: int) -> list[list[int]]:
+    '''Returns the lines of cells of a board in every direction of DIRECTIONS, the result is cached per size
+
+    :param int w: the width of the board
+    :param int h: the height of the board
+    :return list[list[int]]: the indexes of the cells of each line, from its first cell
+    '''
+    lines = []
+    for dx, dy in DIRECTIONS:
+        for y in range(h):
+            for x in range(w):
+                if 0 <= x - dx < w and y - dy >= 0:
+                    continue # Only start from the first cell of each line
+                n = 1
+                while 0 <= x + n * dx < w and y + n * dy < h:
+                    n += 1
+                lines.append([(y + k * dy) * w + x + k * dx for k in range(n)])
+    return lines
+
+
+def find_runs(board: B, w: int, h: int, rng: random.Random = None) -> tuple[set[int], set[int], set[int]]:
+    '''Finds all the aligned cells of the board like find_alignments with the default rules, by scanning the runs of cells
+    This mirrors DEFAULT_PATTERNS, both have to be kept in sync: every run of at least 3 cells is aligned,
+    and each of its cells starts a shorter run, which spawns a rainbow cell if it is at least 5 cells long, or a cross cell if it is 4 cells long
+
+    :param B board: the board to check
+    :param int w: the width of the board
+    :param int h: the height of the board
+    :param random.Random rng: the generator used to place the special cells, if None they are placed at the start of their run
+    :return tuple[set[int], set[int], set[int]]: see find_alignments
+    '''
+    aligned_cells, rainbow_cells, cross_cells = set(), set(), set()
+    for line in board_lines(w, h):
+        for code, run in groupby(line, board.__getitem__):
+            run = list(run)
+            if len(run) >= 3 and is_normal(code):
+                aligned_cells.update(run)
+                for k in range(len(run) - 3):
+                    length = len(run) - k
+                    (rainbow_cells if length >= 5 else cross_cells).add(run[k + (rng.randint(0, length - 1) if rng else 0)])
+    return aligned_cells, rainbow_cells, cross_cells
+
+
+def clear_alignments(board: B, w: int, h: int, add_rainbow_cells: bool = True, add_cross_cells: bool = True, rng: random.Random = None, patterns: PatternSet = None, workers: int = 1) -> tuple[dict[int, int], int, int]:
+    '''Removes all the aligned cells of the board in place and adds the special cells
+
+    :param B board: the board to update
+    :param int w: the width of the board
+    :param int h: the height of the board
+    :param bool add_rainbow_cells: Does the function has to create rainbow cells?
+    :param bool add_cross_cells: Does the function has to create cross cells?
+    :param random.Random rng: the generator used to place the special cells
+    :param PatternSet patterns: the match patterns, if None the default ones
+    :param int workers: the number of threads matching the patterns on tiles of rows, for very large boards
+        Unless the runs of the default rules are scanned on a small board, the board is updated with numpy through a view of its memory
+    :return tuple[dict[int, int], int, int]:
+        - the number of aligned cells per code
+        - the number of rainbow cells added
+        - the number of cross cells added
+    '''
+    rainbow_before, cross_before = board.count(RAINBOW), board.count(CROSS)
+    if patterns is not None or workers > 1 or w * h > SCAN_MAX_CELLS:
+        codes = numpy.frombuffer(board, numpy.uint8).reshape(h, w)
+        aligned, spawns = tiling.match_tiled(
+            patterns or DEFAULT_PATTERNS, codes, numpy.random.default_rng(rng.getrandbits(64)) if rng else None, workers
+        )
+        counts = numpy.bincount(codes[aligned], minlength=256)
+        codes[aligned] = EMPTY
+        # The spawns are in placement order, so the cross cells are placed last with the default rules
+        special_cells = {'rainbow': RAINBOW if add_rainbow_cells else None, 'cross': CROSS if add_cross_cells else None}
+        for name, indexes in spawns:
+            if special_cells.get(name) is not None:
+                codes.reshape(-1)[indexes] = special_cells[name]
+        return (
+            {code: amount for code, amount in enumerate(counts.tolist()) if amount},
+            board.count(RAINBOW) - rainbow_before,
+            board.count(CROSS) - cross_before
+        )
+
+    aligned_cells, rainbow_cells, cross_cells = find_runs(board, w, h, rng)
+
+    aligned_cells_count = {}
+    for i in aligned_cells:
+        aligned_cells_count[board[i]] = aligned_cells_count.get(board[i], 0) + 1
+        board[i] = EMPTY
+
+    # The cross cells are placed last, like in game_logic.detect_alignments
+    if add_rainbow_cells:
+        for i in rainbow_cells - cross_cells if add_cross_cells else rainbow_cells:
+            board[i] = RAINBOW
+    if add_cross_cells:
+        for i in cross_cells:
+            board[i] = CROSS
+
+    return (
+        aligned_cells_count,
+        board.count(RAINBOW) - rainbow_before,
+        board.count(CROSS) - cross_before
+    )
+
+
+def rainbow_cell_interaction(board: B, rainbow_index: int, other_index: int) -> dict[int, int]:
+    '''Applies the effect of a rainbow cell on the board in place,
+    by removing all cells of the same type of the one that was interacted with
+
+    :param B board: the board to update
+    :param int rainbow_index: the index of the rainbow cell
+    :param int other_index: the index of the other cell
+    :return dict[int, int]: the number of aligned cells per code
+    '''
+    code = board[other_index]
+    board[rainbow_index] = EMPTY
+    count = board.count(code)
+    if code != EMPTY:
+        board[:] = board.replace(bytes((code,)), bytes((EMPTY,)))
+    return {code: count}
+
+
+def cross_cell_interaction(board: B, w: int, h: int, cross_index: int, other_index: int) -> dict[int, int]:
+    '''Applies the effect of a cross cell on the board in place,
+    by removing all cells in the same row or column as the one that was interacted with
+
+    :param B board: the board to update
+    :param int w: the width of the board
+    :param int h: the height of the board
+    :param int cross_index: the index of the cross cell
+    :param int other_index: the index of the other cell
+    :return dict[int, int]: the number of aligned cells per code
+    '''
+    if cross_index % w == other_index % w: # The cells are on the same column
+        indexes = range(cross_index % w, w * h, w)
+    else: # The cells are on the same row
+        start = cross_index - cross_index % w
+        indexes = range(start, start + w)
+
+    aligned_cell_count = {}
+    for i in indexes:
+        aligned_cell_count[board[i]] = aligned_cell_count.get(board[i], 0) + 1
+        board[i] = EMPTY
+    return aligned_cell_count
+
+
+def play_swap(board: B, w: int, h: int, a: int, b: int) -> tuple[str, dict[int, int]]:
+    '''Plays a swap between two adjacent cells in place, the same way the game does:
+    an interaction with a rainbow cell (unless both cells are rainbow cells),
+    then an interaction with a cross cell, otherwise a normal swap
+
+    :param B board: the board to update
+    :param int w: the width of the board
+    :param int h: the height of the board
+    :param int a: the index of the first cell
+    :param int b: the index of the second cell
+    :return tuple[str, dict[int, int]]: the kind of move ('rainbow', 'cross' or 'swap') and the number of removed cells per code
+    '''
+    if (board[a] == RAINBOW or board[b] == RAINBOW) and board[a] != board[b]:
+        rainbow_index, other_index = (a, b) if board[a] == RAINBOW else (b, a)
+        return 'rainbow', rainbow_cell_interaction(board, rainbow_index, other_index)
+    if board[a] == CROSS or board[b] == CROSS:
+        cross_index, other_index = (a, b) if board[a] == CROSS else (b, a)
+        return 'cross', cross_cell_interaction(board, w, h, cross_index, other_index)
+    board[a], board[b] = board[b], board[a]
+    return 'swap', {}
+
+
+def apply_gravity(board: B, w: int, h: int) -> list[int]:
+    '''Moves all the cells down in place so that the holes end up at the top of each column
+
+    :param B board: the board to update
+    :param int w: the width of the board
+    :param int h: the height of the board
+    :return list[int]: the indexes of the remaining holes
+    '''
+    holes = []
+    for x in range(w):
+        column = board[x::w]
+        if EMPTY not in column:
+            continue
+        column = column.replace(b'\x00', b'')
+        missing = h - len(column)
+        board[x::w] = bytes(missing) + column
+        holes.extend(range(x, missing * w, w))
+    return holes
+
+
+def refill(board: B, holes: list[int], cell_types: int, rng: random.Random, weights: list[float] = None) -> None:
+    '''Fills the holes of the board in place with random normal cells, all drawn in a single call
+
+    :param B board: the board to update
+    :param list[int] holes: the indexes of the holes
+    :param int cell_types: the number of normal cell types
+    :param random.Random rng: the random generator
+    :param list[float] weights: the spawn weight of each normal cell type, they are all equally likely if None
+    '''
+    for i, code in zip(holes, rng.choices(range(1, cell_types + 1), weights, k=len(holes))):
+        board[i] = code
+
+
+def resolve(board: B, w: int, h: int, cell_types: int, rng: random.Random = None, add_rainbow_cells: bool = True, add_cross_cells: bool = True, weights: list[float] = None, patterns: PatternSet = None, workers: int = 1) -> tuple[dict[int, int], int, int, int]:
+    '''Resolves all the cascades of the board in place, the same way the game loop does:
+    the alignments are removed, then the cells fall and the holes are refilled, until no alignment remains,
+    the refilled cells included, so an empty board is filled without any alignment
+    If no random generator is given, the holes are not refilled and stay empty
+
+    :param B board: the board to update
+    :param int w: the width of the board
+    :param int h: the height of the board
+    :param int cell_types: the number of normal cell types
+    :param random.Random rng: the random generator used for the new cells
+    :param bool add_rainbow_cells: Does the function has to create rainbow cells?
+    :param bool add_cross_cells: Does the function has to create cross cells?
+    :param list[float] weights: the spawn weight of each normal cell type, they are all equally likely if None
+    :param PatternSet patterns: the match patterns, see clear_alignments
+    :param int workers: the number of threads, see clear_alignments
+    :return tuple[dict[int, int], int, int, int]:
+        - the number of aligned cells per code
+        - the number of rainbow cells added
+        - the number of cross cells added
+        - the depth of the cascade
+    '''
+    total = {}
+    rainbow_cells = cross_cells = depth = 0
+    while True:
+        aligned_cells_count, rainbow, cross = clear_alignments(board, w, h, add_rainbow_cells, add_cross_cells, rng, patterns, workers)
+        holes = apply_gravity(board, w, h)
+        if aligned_cells_count:
+            for code, amount in aligned_cells_count.items():
+                total[code] = total.get(code, 0) + amount
+            rainbow_cells += rainbow
+            cross_cells += cross
+            depth += 1
+        elif not rng or not holes:
+            # Nothing is aligned, including the cells refilled by the previous pass
+            return total, rainbow_cells, cross_cells, depth
+        if rng:
+            refill(board, holes, cell_types, rng, weights)
@@ -0,0 +1,278 @@
+import os
+import random
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+
+from scripts.game_logic import G, C
+import scripts.board as board_logic
+from scripts.board import B
+
+
+
+def candidate_moves(board: B, w: int, h: int) -> list[tuple[int, int]]:
+    '''Lists all the swaps that can change the board, as pairs of cell indexes
+
+    :param B board: the board to check
+    :param int w: the width of the board
+    :param int h: the height of the board
+    :return list[tuple[int, int]]: the candidate moves
+    '''
+    moves = []
+    for i in range(w * h):
+        if board[i] == board_logic.EMPTY:
+            continue
+        for j in (i + 1 if (i + 1) % w else None, i + w if i + w < w * h else None):
+            # Swapping two identical cells changes nothing, except for two cross cells which interact
+            if j is not None and board[j] != board_logic.EMPTY and (board[j] != board[i] or board[i] == board_logic.CROSS):
+                moves.append((i, j))
+    return moves
+
+
+def objective_weights(objectives: list[int], scores: list[int]) -> list[float]:
+    '''Computes the weight of each cell code from the remaining objectives,
+    so that a cleared cell is worth the share of its objective that is still missing
+
+    :param list[int] objectives: the list of objectives
+    :param list[int] scores: the list of scores
+    :return list[float]: the weight of each code, indexed by code (EMPTY and special cells are worth 0)
+    '''
+    weights = [0.] * 256
+    for i in range(len(objectives)):
+        weights[i + 1] = max(objectives[i] - scores[i], 0) / objectives[i] if objectives[i] else 0.
+    if not any(weights): # All the objectives are completed, every cell is worth the same
+        weights[1:len(objectives) + 1] = [1.] * len(objectives)
+    return weights
+
+
+def simulate_move(board: B, w: int, h: int, move: tuple[int, int], cell_types: int, rng: random.Random = None, add_rainbow_cells: bool = True, add_cross_cells: bool = True) -> tuple[dict[int, int], int, int]:
+    '''Plays a move and resolves its cascade in place
+
+    :param B board: the board to update
+    :param int w: the width of the board
+    :param int h: the height of the board
+    :param tuple[int, int] move: the indexes of the swapped cells
+    :param int cell_types: the number of normal cell types
+    :param random.Random rng: the generator used to refill the holes, if None they stay empty
+    :param bool add_rainbow_cells: Does the move has to create rainbow cells?
+    :param bool add_cross_cells: Does the move has to create cross cells?
+    :return tuple[dict[int, int], int, int]: the number of removed cells per code, the number of rainbow cells and of cross cells added
+    '''
+    _, removed = board_logic.play_swap(board, w, h, *move)
+    aligned_cells_count, rainbow_cells, cross_cells, _ = board_logic.resolve(
+        board, w, h, cell_types, rng, add_rainbow_cells, add_cross_cells
+    )
+    for code, amount in aligned_cells_count.items():
+        removed[code] = removed.get(code, 0) + amount
+    return removed, rainbow_cells, cross_cells
+
+
+def evaluate_move(board: B, w: int, h: int, move: tuple[int, int], objectives: list[int], scores: list[int], depth: int = 1, beam_width: int = 8, samples: int = 0, discount: float = 0.9, seed: int = None, add_rainbow_cells: bool = True, add_cross_cells: bool = True) -> float:
+    '''Computes the expected score of a move, where each removed cell is weighted by its remaining objective
+    With a depth greater than 1, the discounted score of the best follow-up move is added
+
+    :param B board: the board before the move, it is not modified
+    :param int w: the width of the board
+    :param int h: the height of the board
+    :param tuple[int, int] move: the indexes of the swapped cells
+    :param list[int] objectives: the list of objectives
+    :param list[int] scores: the list of scores
+    :param int depth: the number of moves to look ahead
+    :param int beam_width: the number of follow-up moves explored at each level
+    :param int samples: the number of random refills to average over, if 0 the holes stay empty
+    :param float discount: the factor applied to the score of the follow-up moves
+    :param int seed: the seed of the refills
+    :param bool add_rainbow_cells: Does the move has to create rainbow cells?
+    :param bool add_cross_cells: Does the move has to create cross cells?
+    :return float: the expected score of the move
+    '''
+    a, b = move
+    # A normal swap on a stable board can only align the two swapped cells
+    if depth <= 1 and board_logic.is_normal(board[a]) and board_logic.is_normal(board[b]):
+        board[a], board[b] = board[b], board[a]
+        aligned = board_logic.is_aligned(board, w, h, a) or board_logic.is_aligned(board, w, h, b)
+        board[a], board[b] = board[b], board[a]
+        if not aligned:
+            return 0.
+
+    cell_types = len(objectives)
+    rngs = [random.Random(f'{seed}-{move}-{k}') for k in range(samples)] if samples else [None]
+    weights = objective_weights(objectives, scores)
+    total = 0.
+    for rng in rngs:
+        new_board = board.copy()
+        removed, _, _ = simulate_move(new_board, w, h, move, cell_types, rng, add_rainbow_cells, add_cross_cells)
+        score = sum(weights[code] * amount for code, amount in removed.items())
+
+        if depth > 1:
+            new_scores = [scores[i] + removed.get(i + 1, 0) for i in range(cell_types)]
+            follow_ups = best_moves(new_board, w, h, objectives, new_scores, depth - 1, beam_width, samples, discount, seed, add_rainbow_cells, add_cross_cells)
+            if follow_ups:
+                score += discount * follow_ups[0][0]
+        total += score
+    return total / len(rngs)
+
+
+def evaluate_moves(board: B, w: int, h: int, moves: list[tuple[int, int]], *args) -> list[tuple[float, tuple[int, int]]]:
+    '''Evaluates a list of moves and sorts them from the best to the worst
+    See evaluate_move for the other parameters
+
+    :param list[tuple[int, int]] moves: the moves to evaluate
+    :return list[tuple[float, tuple[int, int]]]: the score of each move along with the move
+    '''
+    evaluated = [(evaluate_move(board, w, h, move, *args), move) for move in moves]
+    evaluated.sort(key=lambda e: e[0], reverse=True)
+    return evaluated
+
+
+def best_moves(board: B, w: int, h: int, objectives: list[int], scores: list[int], depth: int = 1, beam_width: int = 8, samples: int = 0, discount: float = 0.9, seed: int = None, add_rainbow_cells: bool = True, add_cross_cells: bool = True, evaluator: Callable = evaluate_moves) -> list[tuple[float, tuple[int, int]]]:
+    '''Evaluates the candidate moves of a board and sorts them from the best to the worst
+    With a depth greater than 1, only the beam_width best moves of a greedy pass are kept and looked ahead
+    See evaluate_move for the other parameters
+
+    :param Callable evaluator: the function evaluating and sorting a list of moves, with the parameters of evaluate_moves
+    :return list[tuple[float, tuple[int, int]]]: the score of each move along with the move
+    '''
+    args = (objectives, scores, 1, beam_width, samples, discount, seed, add_rainbow_cells, add_cross_cells)
+    evaluated = evaluator(board, w, h, candidate_moves(board, w, h), *args)
+    if depth > 1:
+        beam = [move for _, move in evaluated[:beam_width]]
+        evaluated = evaluator(board, w, h, beam, objectives, scores, depth, *args[3:])
+    return evaluated
+
+
+def _evaluate_moves_worker(args: tuple) -> list[tuple[float, tuple[int, int]]]:
+    '''Entry point of the worker processes, unpacks the arguments of evaluate_moves'''
+    board, *args = args
+    return evaluate_moves(bytearray(board), *args)
+
+
+
+class Bot:
+
+    def __init__(self, objectives: list[int], depth: int = 1, beam_width: int = 8, samples: int = 0, discount: float = 0.9, processes: int = 1, seed: int = None) -> None:
+        '''Initializes the bot
+        A depth of 1 makes a greedy bot, a greater depth looks ahead with a beam search
+
+        :param list[int] objectives: the list of objectives, where each element is the number of cells of the corresponding type that need to be obtained
+        :param int depth: the number of moves to look ahead
+        :param int beam_width: the number of follow-up moves explored at each level
+        :param int samples: the number of random refills to average over, if 0 the holes are left empty
+        :param float discount: the factor applied to the score of the follow-up moves
+        :param int processes: the number of worker processes, 1 evaluates the moves in the current process and None uses all the cores
+        :param int seed: the seed of the refills
+        '''
+        self.objectives = objectives
+        self.depth = depth
+        self.beam_width = beam_width
+        self.samples = samples
+        self.discount = discount
+        self.processes = processes or os.cpu_count()
+        self.seed = seed
+        self.executor = None
+
+
+    def choose(self, board: B, w: int, h: int, scores: list[int], add_rainbow_cells: bool = True, add_cross_cells: bool = True) -> tuple[int, int] | None:
+        '''Chooses the best move of a compact board
+
+        :param B board: the board to play on
+        :param int w: the width of the board
+        :param int h: the height of the board
+        :param list[int] scores: the list of scores
+        :param bool add_rainbow_cells: Can the move create rainbow cells?
+        :param bool add_cross_cells: Can the move create cross cells?
+        :return tuple[int, int] | None: the indexes of the cells to swap, None if no move is possible
+        '''
+        evaluated = best_moves(
+            board, w, h, self.objectives, scores, self.depth, self.beam_width, self.samples, self.discount, self.seed,
+            add_rainbow_cells, add_cross_cells, self.evaluate_moves
+        )
+        return evaluated[0][1] if evaluated else None
+
+
+    def evaluate_moves(self, board: B, w: int, h: int, moves: list[tuple[int, int]], *args) -> list[tuple[float, tuple[int, int]]]:
+        '''Evaluates a list of moves, spread over the worker processes
+        See evaluate_move for the other parameters
+
+        :param B board: the board to play on
+        :param int w: the width of the board
+        :param int h: the height of the board
+        :param list[tuple[int, int]] moves: the moves to evaluate
+        :return list[tuple[float, tuple[int, int]]]: the score of each move along with the move, from the best to the worst
+        '''
+        if self.processes <= 1 or len(moves) < 2:
+            return evaluate_moves(board, w, h, moves, *args)
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.processes)
+        # The board is sent as bytes, which is much cheaper to pickle than a grid of tuples
+        chunks = [moves[i::self.processes] for i in range(min(self.processes, len(moves)))]
+        evaluated = []
+        for result in self.executor.map(_evaluate_moves_worker, [(bytes(board), w, h, chunk, *args) for chunk in chunks]):
+            evaluated.extend(result)
+        evaluated.sort(key=lambda e: e[0], reverse=True)
+        return evaluated
+
+
+    def choose_move(self, g: G, cells: list[C], scores: list[int], add_rainbow_cells: bool = True, add_cross_cells: bool = True) -> tuple[tuple[int, int], tuple[int, int]] | None:
+        '''Chooses the best move of a grid
+
+        :param G g: the grid to play on
+        :param list[C] cells: the list of normal cell types
+        :param list[int] scores: the list of scores
+        :param bool add_rainbow_cells: Can the move create rainbow cells?
+        :param bool add_cross_cells: Can the move create cross cells?
+        :return tuple[tuple[int, int], tuple[int, int]] | None: the coordinates of the cells to swap, None if no move is possible
+        '''
+        w, h = len(g[0]), len(g)
+        move = self.choose(board_logic.encode_grid(g, cells), w, h, scores, add_rainbow_cells, add_cross_cells)
+        if move is None:
+            return None
+        return (move[0] % w, move[0] // w), (move[1] % w, move[1] // w)
+
+
+    def close(self) -> None:
+        '''Shuts down the worker processes'''
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+
+def play_game(bot: Bot, size: tuple[int, int], max_moves: int = 1000, max_rainbow_cells: int = 5, max_cross_cells: int = 5, seed: int = None) -> tuple[int, list[int], bool]:
+    '''Plays a whole game with a bot without any window, to test the difficulty of a configuration
+
+    :param Bot bot: the bot playing the game
+    :param tuple[int, int] size: the size of the grid
+    :param int max_moves: the maximum number of moves to play
+    :param int max_rainbow_cells: the maximum number of rainbow cells created by the game
+    :param int max_cross_cells: the maximum number of cross cells created by the game
+    :param int seed: the seed of the game
+    :return tuple[int, list[int], bool]: the number of moves played, the final scores and True if the game was won
+    '''
+    w, h = size
+    cell_types = len(bot.objectives)
+    rng = random.Random(seed)
+    board = bytearray(w * h)
+    board_logic.resolve(board, w, h, cell_types, rng, False, False)
+    scores = [0] * cell_types
+    rainbow_cells_nb = cross_cells_nb = 0
+
+    def has_won() -> bool:
+        return all(scores[i] >= bot.objectives[i] for i in range(cell_types))
+
+    moves = 0
+    while moves < max_moves and not has_won():
+        add_rainbow_cells, add_cross_cells = rainbow_cells_nb < max_rainbow_cells, cross_cells_nb < max_cross_cells
+        move = bot.choose(board, w, h, scores, add_rainbow_cells, add_cross_cells)
+        if move is None:
+            break
+        rainbow_cells_nb -= board[move[0]] == board_logic.RAINBOW or board[move[1]] == board_logic.RAINBOW
+        cross_cells_nb -= (board[move[0]] == board_logic.CROSS or board[move[1]] == board_logic.CROSS) \
+            and board[move[0]] != board_logic.RAINBOW and board[move[1]] != board_logic.RAINBOW
+        removed, rainbow_cells, cross_cells = simulate_move(board, w, h, move, cell_types, rng, add_rainbow_cells, add_cross_cells)
+        rainbow_cells_nb += rainbow_cells
+        cross_cells_nb += cross_cells
+        for i in range(cell_types):
+            scores[i] += removed.get(i + 1, 0)
+        moves += 1
+    return moves, scores, has_won()
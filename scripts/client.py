@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import struct
+
+from scripts.board import B
+from scripts.bot import Bot
+from scripts.server import HEADER, LENGTH, NEW_SESSION_PAYLOAD, SWAP_PAYLOAD, SIZE, NEW_SESSION, SWAP, STATE, CLOSE_SESSION, OK
+
+
+
+def decode_swap_response(response: bytes) -> tuple[bool, int, dict[int, int], list[tuple[int, int]]]:
+    '''Decodes the response of a successful swap request
+
+    :param bytes response: the response, starting with its status
+    :return tuple[bool, int, dict[int, int], list[tuple[int, int]]]:
+        - True if the game is won
+        - the depth of the cascade
+        - the score delta per code
+        - the changed cells, as (index, new code)
+    '''
+    won, depth, deltas_nb = response[1], response[2], response[3]
+    offset = 4
+    deltas = {}
+    for _ in range(deltas_nb):
+        code, amount = struct.unpack_from('!BI', response, offset)
+        deltas[code] = amount
+        offset += 5
+    changed_nb, = LENGTH.unpack_from(response, offset)
+    offset += LENGTH.size
+    changed = [struct.unpack_from('!IB', response, offset + 5 * i) for i in range(changed_nb)]
+    return bool(won), depth, deltas, changed
+
+
+
+class GameClient:
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''Initializes a client from an open connection, see GameClient.connect
+
+        :param asyncio.StreamReader reader: the stream to read the responses from
+        :param asyncio.StreamWriter writer: the stream to write the requests to
+        '''
+        self.reader = reader
+        self.writer = writer
+        self.lock = asyncio.Lock()
+
+
+    @classmethod
+    async def connect(cls, host: str = '127.0.0.1', port: int = 5555, path: str = None) -> 'GameClient':
+        '''Connects to a game server, on a Unix socket if a path is given, on TCP otherwise
+
+        :param str host: the host of the server
+        :param int port: the port of the server
+        :param str path: the path of the Unix socket
+        :return GameClient: the connected client
+        '''
+        if path:
+            return cls(*await asyncio.open_unix_connection(path))
+        return cls(*await asyncio.open_connection(host, port))
+
+
+    async def request(self, opcode: int, session_id: int = 0, payload: bytes = b'') -> bytes:
+        '''Sends a request and waits for its response
+
+        :param int opcode: the opcode of the request
+        :param int session_id: the id of the session
+        :param bytes payload: the payload of the request
+        :return bytes: the response, starting with its status
+        '''
+        request = HEADER.pack(opcode, session_id) + payload
+        async with self.lock:
+            self.writer.write(LENGTH.pack(len(request)) + request)
+            await self.writer.drain()
+            length, = LENGTH.unpack(await self.reader.readexactly(LENGTH.size))
+            response = await self.reader.readexactly(length)
+        if response[0] != OK:
+            raise ValueError(f'The request failed with status {response[0]}')
+        return response
+
+
+    async def new_session(self, width: int, height: int, objectives: list[int], seed: int = 0) -> tuple[int, B]:
+        '''Creates a new session
+
+        :param int width: the width of the board
+        :param int height: the height of the board
+        :param list[int] objectives: the list of objectives
+        :param int seed: the seed of the session
+        :return tuple[int, B]: the id of the session and its board
+        '''
+        response = await self.request(
+            NEW_SESSION, 0,
+            NEW_SESSION_PAYLOAD.pack(width, height, seed) + struct.pack(f'!{len(objectives)}I', *objectives)
+        )
+        session_id, = LENGTH.unpack_from(response, 1)
+        return session_id, bytearray(response[1 + LENGTH.size:])
+
+
+    async def swap(self, session_id: int, pos: tuple[int, int], new_pos: tuple[int, int]) -> tuple[bool, int, dict[int, int], list[tuple[int, int]]]:
+        '''Swaps two cells of a session, see decode_swap_response for the result
+
+        :param int session_id: the id of the session
+        :param tuple[int, int] pos: the position of the first cell
+        :param tuple[int, int] new_pos: the position of the second cell
+        :return tuple[bool, int, dict[int, int], list[tuple[int, int]]]: the decoded response
+        '''
+        return decode_swap_response(await self.request(SWAP, session_id, SWAP_PAYLOAD.pack(*pos, *new_pos)))
+
+
+    async def state(self, session_id: int, cell_types: int) -> tuple[int, int, list[int], B]:
+        '''Gets the state of a session
+
+        :param int session_id: the id of the session
+        :param int cell_types: the number of normal cell types, which is the number of scores
+        :return tuple[int, int, list[int], B]: the width, the height, the scores and the board
+        '''
+        response = await self.request(STATE, session_id)
+        width, height = SIZE.unpack_from(response, 1)
+        offset = 1 + SIZE.size
+        scores = list(struct.unpack_from(f'!{cell_types}I', response, offset))
+        return width, height, scores, bytearray(response[offset + 4 * cell_types:])
+
+
+    async def close_session(self, session_id: int) -> None:
+        '''Closes a session
+
+        :param int session_id: the id of the session
+        '''
+        await self.request(CLOSE_SESSION, session_id)
+
+
+    async def close(self) -> None:
+        '''Closes the connection'''
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+
+async def play_session(client: GameClient, bot: Bot, size: tuple[int, int], seed: int, max_moves: int) -> tuple[int, list[int], bool]:
+    '''Plays a whole game on the server with a bot, keeping a copy of the board up to date from the changed cells
+
+    :param GameClient client: the connected client
+    :param Bot bot: the bot choosing the moves
+    :param tuple[int, int] size: the size of the board
+    :param int seed: the seed of the session
+    :param int max_moves: the maximum number of moves to play
+    :return tuple[int, list[int], bool]: the number of moves played, the final scores and True if the game was won
+    '''
+    w, h = size
+    session_id, board = await client.new_session(w, h, bot.objectives, seed)
+    scores = [0] * len(bot.objectives)
+    won = False
+    moves = 0
+    while moves < max_moves and not won:
+        move = bot.choose(board, w, h, scores)
+        if move is None:
+            break
+        won, _, deltas, changed = await client.swap(session_id, (move[0] % w, move[0] // w), (move[1] % w, move[1] // w))
+        for code, amount in deltas.items():
+            scores[code - 1] += amount
+        for i, code in changed:
+            board[i] = code
+        moves += 1
+
+    # Make sure the copy of the board did not drift from the server's one
+    _, _, server_scores, server_board = await client.state(session_id, len(scores))
+    if server_board != board or server_scores != scores:
+        raise RuntimeError(f'Session {session_id} is out of sync with the server')
+    await client.close_session(session_id)
+    return moves, scores, won
+
+
+async def main(args: argparse.Namespace) -> None:
+    '''Plays many concurrent games on a server and prints a summary
+
+    :param argparse.Namespace args: the command line arguments
+    '''
+    client = await GameClient.connect(args.host, args.port, args.unix)
+    bot = Bot([args.objective] * 6)
+    results = await asyncio.gather(*(
+        play_session(client, bot, (args.width, args.height), seed, args.max_moves)
+        for seed in range(args.games)
+    ))
+    await client.close()
+
+    won = sum(result[2] for result in results)
+    moves = sum(result[0] for result in results)
+    print(f'{won}/{len(results)} games won, {moves / len(results):.1f} moves per game on average')
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plays many concurrent games on a game server with the greedy bot')
+    parser.add_argument('--host', default='127.0.0.1', help='the host of the server')
+    parser.add_argument('--port', type=int, default=5555, help='the port of the server')
+    parser.add_argument('--unix', help='the path of the Unix socket of the server, instead of TCP')
+    parser.add_argument('--games', type=int, default=100, help='the number of games to play')
+    parser.add_argument('--width', type=int, default=15, help='the width of the boards')
+    parser.add_argument('--height', type=int, default=10, help='the height of the boards')
+    parser.add_argument('--objective', type=int, default=30, help='the objective of each cell type')
+    parser.add_argument('--max-moves', type=int, default=200, help='the maximum number of moves of each game')
+    asyncio.run(main(parser.parse_args()))
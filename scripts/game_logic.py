@@ -1,5 +1,12 @@
+import operator
+from collections import defaultdict, deque
+from itertools import chain, repeat
+
 import pygame
-import random
+import numpy
+
+from scripts.patterns import PatternSet, DEFAULT_PATTERNS, EMPTY, CROSS, RAINBOW, RNG
+import scripts.tiling as tiling
 
 
 
@@ -35,17 +42,18 @@ def copy_grid(g: G) -> G:
     return new_grid
 
 
-def generate_filled_grid(size: tuple[int, int], cells: list[C], rainbow_cell: C, cross_cell: C) -> G:
+def generate_filled_grid(size: tuple[int, int], cells: list[C], rainbow_cell: C, cross_cell: C, weights: list[float] = None) -> G:
     '''Generates a filled grid of the specified size with the specified cells
     
     :param tuple[int, int] size: the size of the grid
     :param list[C] cells: the list of cells to use
     :param C rainbow_cell: the rainbow cell type
     :param C cross_cell: the cross cell type
+    :param list[float] weights: the spawn weight of each cell, they are all equally likely if None
     :return G: the generated grid
     '''
     grid = generate_grid(*size)
-    movements, grid = fill_grid(grid, cells)
+    movements, grid = fill_grid(grid, cells, weights=weights)
     for mov in movements:
         x, y, cell = mov[2], mov[3], mov[4]
         grid[y][x] = cell
@@ -59,7 +67,7 @@ def generate_filled_grid(size: tuple[int, int], cells: list[C], rainbow_cell: C,
     )
     # Make sure the generated grid does not contain any alignment
     while aligned_cells:
-        movements, grid = fill_grid(grid, cells)
+        movements, grid = fill_grid(grid, cells, weights=weights)
         for mov in movements:
             x, y, cell = mov[2], mov[3], mov[4]
             grid[y][x] = cell
@@ -74,16 +82,37 @@ def generate_filled_grid(size: tuple[int, int], cells: list[C], rainbow_cell: C,
     return grid
 
 
-def fill_grid(g: G, cells: list[C]) -> tuple[M, G]:
+def draw_cells(weights: list[float], count: int, rng: numpy.random.Generator = RNG) -> numpy.ndarray:
+    '''Draws random cell indexes in a single vectorized pass, by sampling a cumulative table of the weights
+
+    :param list[float] weights: the spawn weight of each cell, they do not need to be normalized
+    :param int count: the number of cells to draw
+    :param numpy.random.Generator rng: the random generator
+    :return numpy.ndarray: the indexes of the drawn cells
+    '''
+    cumulative = numpy.cumsum(weights, dtype=float)
+    if len(cumulative) == 0 or cumulative[-1] <= 0 or numpy.any(numpy.asarray(weights) < 0):
+        raise ValueError(f'Invalid spawn weights: {weights}')
+    indexes = numpy.searchsorted(cumulative, rng.random(count) * cumulative[-1], side='right')
+    # The product can be rounded up to the total, which must still give a cell with a positive weight
+    return numpy.minimum(indexes, numpy.flatnonzero(weights)[-1])
+
+
+def fill_grid(g: G, cells: list[C], workers: int = 1, weights: list[float] = None) -> tuple[M, G]:
     '''Fills the holes in the grid by moving all the elements down and adding new random elements at the top
     
     :param G g: the grid to fill
     :param list[C] cells: the list of elements to add to the grid
+    :param int workers: the number of threads computing the gravity on tiles of columns, for very large grids
+    :param list[float] weights: the spawn weight of each element, they are all equally likely if None
     :return tuple[M, G]: a list of all the movements that were made and an intermediate grid
         The format of each element of the movement list is (x, y, new_x, new_y)
         If the cell is a new one, x and y are None
         The intermediate grid is the grid of all unaffected cells
     '''
+    if workers > 1:
+        return fill_grid_tiled(g, cells, workers, weights)
+
     new_grid = copy_grid(g)
     intermediate_grid = copy_grid(g)
     movements = []
@@ -103,16 +132,62 @@ def fill_grid(g: G, cells: list[C]) -> tuple[M, G]:
                     else:
                         i -= 1
     
-    # add new elements to the grid
-    for y in range(len(g)-1, -1, -1):
-        for x in range(len(g[y])):
-            if new_grid[y][x][0] is None:
-                new_grid[y][x] = random.choice(cells)
-                movements.append((None, None, x, y, new_grid[y][x]))
+    # add new elements to the grid, all drawn at once
+    holes = [(x, y) for y in range(len(g)-1, -1, -1) for x in range(len(g[y])) if new_grid[y][x][0] is None]
+    new_cells = draw_cells(weights or [1] * len(cells), len(holes)).tolist()
+    for (x, y), i in zip(holes, new_cells):
+        movements.append((None, None, x, y, cells[i]))
     
     return movements, intermediate_grid
 
 
+def fill_grid_tiled(g: G, cells: list[C], workers: int, weights: list[float] = None) -> tuple[M, G]:
+    '''Fills the holes in the grid like fill_grid, with the gravity computed on tiles of columns by several threads
+    The movements are returned in the same order as fill_grid
+
+    :param G g: the grid to fill
+    :param list[C] cells: the list of elements to add to the grid
+    :param int workers: the number of threads
+    :param list[float] weights: the spawn weight of each element, they are all equally likely if None
+    :return tuple[M, G]: see fill_grid
+    '''
+    # The loops over the cells run in C (map, zip, fromiter), as Python code would not run in parallel anyway
+    names = map(operator.itemgetter(0), chain.from_iterable(g))
+    filled = numpy.fromiter(map(operator.is_not, names, repeat(None)), bool, len(g) * len(g[0])).reshape(len(g), -1)
+    ys, xs, destinations, holes = tiling.gravity_tiled(filled, workers)
+    intermediate_grid = copy_grid(g)
+    set_cells(intermediate_grid, ys, xs, (None, None)) # We remove the moved cells in the intermediate grid
+
+    # Apply gravity to the grid, from the bottom row to the top one
+    order = numpy.lexsort((xs, -destinations))
+    ys, xs, destinations = ys[order].tolist(), xs[order].tolist(), destinations[order].tolist()
+    movements = list(zip(xs, ys, xs, destinations, map(operator.getitem, map(g.__getitem__, ys), xs)))
+
+    # add new elements to the grid
+    new_ys, new_xs = numpy.nonzero(numpy.arange(len(g))[:, None] < holes)
+    order = numpy.lexsort((new_xs, -new_ys))
+    new_cells = map(cells.__getitem__, draw_cells(weights or [1] * len(cells), len(order)).tolist())
+    movements.extend(zip(repeat(None), repeat(None), new_xs[order].tolist(), new_ys[order].tolist(), new_cells))
+
+    return movements, intermediate_grid
+
+
+def set_cells(g: G, ys: numpy.ndarray, xs: numpy.ndarray, cell: C) -> None:
+    '''Sets many cells of the grid in place to the same value, row by row
+
+    :param G g: the grid to update
+    :param numpy.ndarray ys: the rows of the cells
+    :param numpy.ndarray xs: the columns of the cells
+    :param C cell: the new value of the cells
+    '''
+    order = numpy.argsort(ys, kind='stable')
+    ys, xs = ys[order], xs[order]
+    rows, starts = numpy.unique(ys, return_index=True)
+    for y, row_xs in zip(rows.tolist(), numpy.split(xs, starts[1:])):
+        # Consume the map without storing its results, so that the loop runs in C
+        deque(map(g[y].__setitem__, row_xs.tolist(), repeat(cell)), maxlen=0)
+
+
 def movements_from_grid(g: G) -> M:
     '''Converts a grid to a list of movements
 
@@ -129,7 +204,21 @@ def movements_from_grid(g: G) -> M:
 
 
 
-def detect_alignments(g: G, cells: list[C], rainbow_cell: C, cross_cell: C, add_rainbow_cells: bool = True, add_cross_cells: bool = True) -> tuple[dict[str, int], int, int, G]:
+def grid_codes(g: G, cells: list[C]) -> numpy.ndarray:
+    '''Converts a grid to an array of cell codes, used by the pattern engine
+
+    :param G g: the grid to convert
+    :param list[C] cells: the list of normal cell types, their index defines their code (starting from 1)
+    :return numpy.ndarray: the cell codes, in the (height, width) shape
+    '''
+    codes = defaultdict(lambda: EMPTY, {cell[0]: i + 1 for i, cell in enumerate(cells)})
+    codes['rainbow'] = RAINBOW
+    codes['cross'] = CROSS
+    names = map(operator.itemgetter(0), chain.from_iterable(g))
+    return numpy.fromiter(map(codes.__getitem__, names), numpy.uint8, len(g) * len(g[0])).reshape(len(g), -1)
+
+
+def detect_alignments(g: G, cells: list[C], rainbow_cell: C, cross_cell: C, add_rainbow_cells: bool = True, add_cross_cells: bool = True, patterns: PatternSet = DEFAULT_PATTERNS, workers: int = 1) -> tuple[dict[str, int], int, int, G]:
     '''Detects all the aligned cells in the grid and removes them
 
     :param G g: the grid to check
@@ -138,97 +227,47 @@ def detect_alignments(g: G, cells: list[C], rainbow_cell: C, cross_cell: C, add_
     :param C cross_cell: the cross cell type
     :param bool add_rainbow_cells: Does the function has to create rainbow cells?
     :param bool add_cross_cells: Does the function has to create cross cells?
+    :param PatternSet patterns: the match patterns, the straight alignments of the game by default
+    :param int workers: the number of threads matching the patterns on tiles of rows, for very large grids
     :return tuple[dict[str, int], int, int, G]:
         - the number of aligned cells per type
         - the number of rainbow cells added
         - the number of cross cells added
         - the new grid
     '''
-    aligned_cells = set()
-    rainbow_cells = set()
-    cross_cells = set()
-
-    # Check horizontal alignments
-    for y in range(len(g)):
-        for x in range(len(g[y])):
-            if g[y][x] in cells:
-
-                # Check hotizontal alignment
-                n = 1
-                while x+n < len(g[y]) and g[y][x][0] == g[y][x+n][0]: n += 1
-                if n >= 3:
-                    for i in range(n): aligned_cells.add((x+i, y))
-                if n >= 5:
-                    i = random.randint(0, n-1)
-                    rainbow_cells.add((x+i, y))
-                elif n == 4:
-                    i = random.randint(0, n-1)
-                    cross_cells.add((x+i, y))
-
-                # Check vertical alignment
-                n = 1
-                while y+n < len(g) and g[y][x][0] == g[y+n][x][0]: n += 1
-                if n >= 3:
-                    for i in range(n): aligned_cells.add((x, y+i))
-                if n >= 5:
-                    i = random.randint(0, n-1)
-                    rainbow_cells.add((x, y+i))
-                elif n == 4:
-                    i = random.randint(0, n-1)
-                    cross_cells.add((x, y+i))
-
-                # Check diagonal alignments
-                n = 1
-                while y+n < len(g) and x+n < len(g[y]) and g[y][x][0] == g[y+n][x+n][0]: n += 1
-                if n >= 3:
-                    for i in range(n): aligned_cells.add((x+i, y+i))
-                if n >= 5:
-                    i = random.randint(0, n-1)
-                    rainbow_cells.add((x+i, y+i))
-                elif n == 4:
-                    i = random.randint(0, n-1)
-                    cross_cells.add((x+i, y+i))
-
-                n = 1
-                while y+n < len(g) and x-n >= 0 and g[y][x][0] == g[y+n][x-n][0]: n += 1
-                if n >= 3:
-                    for i in range(n): aligned_cells.add((x-i, y+i))
-                if n >= 5:
-                    i = random.randint(0, n-1)
-                    rainbow_cells.add((x-i, y+i))
-                elif n == 4:
-                    i = random.randint(0, n-1)
-                    cross_cells.add((x-i, y+i))
-
-
+    codes = grid_codes(g, cells)
+    aligned, spawns = tiling.match_tiled(patterns, codes, RNG, workers)
 
     # Remove aligned cells
     new_grid = copy_grid(g)
-    for y in range(len(g)):
-        for x in range(len(g[y])):
-            if (x, y) in aligned_cells:
-                new_grid[y][x] = (None, None)
+    set_cells(new_grid, *numpy.nonzero(aligned), (None, None))
 
-    # Add the specials cells
+    # Add the specials cells, the last ones placed on a cell win
+    special_cells = {}
     if add_rainbow_cells:
-        for x, y in rainbow_cells:
-            new_grid[y][x] = rainbow_cell
+        special_cells['rainbow'] = rainbow_cell
     if add_cross_cells:
-        for x, y in cross_cells:
-            new_grid[y][x] = cross_cell
+        special_cells['cross'] = cross_cell
+    placed = {}
+    for name, indexes in spawns:
+        if name in special_cells:
+            for i in indexes.tolist():
+                placed[i] = name
+    width = codes.shape[1]
+    for i, name in placed.items():
+        new_grid[i // width][i % width] = special_cells[name]
 
     # Count the number of aligned cells per type
     aligned_cells_count = {}
-    for x, y in aligned_cells:
-        if g[y][x][0] in aligned_cells_count:
-            aligned_cells_count[g[y][x][0]] += 1
-        else:
-            aligned_cells_count[g[y][x][0]] = 1
-    
+    for code, amount in enumerate(numpy.bincount(codes[aligned], minlength=len(cells) + 1)[1:len(cells) + 1].tolist()):
+        if amount:
+            aligned_cells_count[cells[code][0]] = amount
+    placed_names = list(placed.values())
+
     return (
         aligned_cells_count,
-        len(rainbow_cells) if add_rainbow_cells else 0,
-        len(cross_cells) if add_cross_cells else 0,
+        placed_names.count('rainbow'),
+        placed_names.count('cross'),
         new_grid
     )
 
@@ -321,6 +360,20 @@ class ScoreManager:
             i += 1
         return completed
     
+    def spawn_weights(self, weights: list[float], objective_bias: float = 0.) -> list[float]:
+        '''Adjusts the spawn weights of the cells by the remaining objectives,
+        so that the cells that are the furthest from their objective spawn more often
+
+        :param list[float] weights: the base spawn weight of each cell
+        :param float objective_bias: how much the remaining objectives increase the weights, 0 keeps the base weights
+            The weight of a cell is multiplied by up to 1 + objective_bias, when none of its objective has been obtained
+        :return list[float]: the adjusted weights
+        '''
+        return [
+            weight * (1 + objective_bias * max(objective - score, 0) / objective) if objective > 0 else weight
+            for weight, objective, score in zip(weights, self.objectives, self.scores)
+        ]
+    
     def update_score(self, cell_name: str, amount: int) -> None:
         '''Updates the score by adding the specified amount of cells of the specified type
 
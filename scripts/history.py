@@ -0,0 +1,151 @@
+import sys
+
+from scripts.game_logic import G
+
+
+
+class Snapshot:
+
+    def __init__(self, chunks: tuple[tuple, ...], width: int, scores: tuple[int, ...], rainbow_cells_nb: int, cross_cells_nb: int, size: int) -> None:
+        '''Initializes a snapshot of the game state
+
+        :param tuple[tuple, ...] chunks: the chunks of the grid, in row-major order
+        :param int width: the width of the grid
+        :param tuple[int, ...] scores: the scores
+        :param int rainbow_cells_nb: the number of rainbow cells on the grid
+        :param int cross_cells_nb: the number of cross cells on the grid
+        :param int size: the memory used by the chunks that are not shared with the previous snapshot, in bytes
+        '''
+        self.chunks = chunks
+        self.width = width
+        self.scores = scores
+        self.rainbow_cells_nb = rainbow_cells_nb
+        self.cross_cells_nb = cross_cells_nb
+        self.size = size
+
+
+    def restore(self) -> tuple[G, list[int], int, int]:
+        '''Rebuilds the game state stored in the snapshot
+
+        :return tuple[G, list[int], int, int]: the grid, the scores, the number of rainbow cells and the number of cross cells
+        '''
+        grid = []
+        row = []
+        for chunk in self.chunks:
+            row.extend(chunk)
+            if len(row) == self.width:
+                grid.append(row)
+                row = []
+        return grid, list(self.scores), self.rainbow_cells_nb, self.cross_cells_nb
+
+
+
+class History:
+
+    def __init__(self, memory_budget: int, chunk_size: int = 64) -> None:
+        '''Initializes the undo/redo history
+        Each snapshot only stores the chunks of the grid that changed since the previous one,
+        the others are shared with it
+
+        :param int memory_budget: the maximum memory used by the snapshots, in bytes, the oldest ones are removed when it is exceeded
+        :param int chunk_size: the maximum number of cells in a chunk, the rows are split into chunks of this size
+        '''
+        self.memory_budget = memory_budget
+        self.chunk_size = chunk_size
+        self.snapshots: list[Snapshot] = []
+        self.index = -1
+        self.memory_usage = 0
+
+
+    @property
+    def can_undo(self) -> bool:
+        '''Returns True if there is a previous state, False otherwise
+
+        :return bool:
+        '''
+        return self.index > 0
+
+
+    @property
+    def can_redo(self) -> bool:
+        '''Returns True if there is a next state, False otherwise
+
+        :return bool:
+        '''
+        return self.index < len(self.snapshots) - 1
+
+
+    def push(self, grid: G, scores: list[int], rainbow_cells_nb: int, cross_cells_nb: int) -> None:
+        '''Records a new state after the current one, the states that could be redone are discarded
+
+        :param G grid: the grid
+        :param list[int] scores: the scores
+        :param int rainbow_cells_nb: the number of rainbow cells on the grid
+        :param int cross_cells_nb: the number of cross cells on the grid
+        '''
+        for snapshot in self.snapshots[self.index + 1:]:
+            self.memory_usage -= snapshot.size
+        del self.snapshots[self.index + 1:]
+
+        previous = self.snapshots[-1].chunks if self.snapshots else ()
+        chunks = []
+        size = 0
+        for row in grid:
+            for x in range(0, len(row), self.chunk_size):
+                chunk = tuple(row[x:x + self.chunk_size])
+                # Share the chunk with the previous snapshot if it did not change
+                if len(chunks) < len(previous) and previous[len(chunks)] == chunk:
+                    chunk = previous[len(chunks)]
+                else:
+                    size += sys.getsizeof(chunk)
+                chunks.append(chunk)
+
+        self.snapshots.append(Snapshot(
+            chunks=tuple(chunks),
+            width=len(grid[0]),
+            scores=tuple(scores),
+            rainbow_cells_nb=rainbow_cells_nb,
+            cross_cells_nb=cross_cells_nb,
+            size=size
+        ))
+        self.memory_usage += size
+        self.index = len(self.snapshots) - 1
+
+        # Remove the oldest snapshots while the budget is exceeded, always keeping the current one
+        while self.memory_usage > self.memory_budget and len(self.snapshots) > 1:
+            self.evict_oldest()
+
+
+    def evict_oldest(self) -> None:
+        '''Removes the oldest snapshot, the chunks it shared with the next one are now accounted to the next one
+        '''
+        oldest, following = self.snapshots[0], self.snapshots[1]
+        for old_chunk, chunk in zip(oldest.chunks, following.chunks):
+            if old_chunk is chunk:
+                following.size += sys.getsizeof(chunk)
+                self.memory_usage += sys.getsizeof(chunk)
+        self.memory_usage -= oldest.size
+        del self.snapshots[0]
+        self.index -= 1
+
+
+    def undo(self) -> tuple[G, list[int], int, int] | None:
+        '''Goes back to the previous state
+
+        :return tuple[G, list[int], int, int] | None: the grid, the scores, the number of rainbow cells and the number of cross cells, None if there is nothing to undo
+        '''
+        if not self.can_undo:
+            return None
+        self.index -= 1
+        return self.snapshots[self.index].restore()
+
+
+    def redo(self) -> tuple[G, list[int], int, int] | None:
+        '''Goes forward to the next state
+
+        :return tuple[G, list[int], int, int] | None: the grid, the scores, the number of rainbow cells and the number of cross cells, None if there is nothing to redo
+        '''
+        if not self.can_redo:
+            return None
+        self.index += 1
+        return self.snapshots[self.index].restore()
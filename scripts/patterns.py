@@ -0,0 +1,204 @@
+import numpy
+
+
+
+EMPTY = 0 # Code of an empty cell, normal cells are numbered from 1 in the order of the cells list
+CROSS = 254 # Code of a cross cell
+RAINBOW = 255 # Code of a rainbow cell
+
+DIRECTIONS = ((1, 0), (0, 1), (1, 1), (-1, 1)) # The directions of the straight alignments
+
+RNG = numpy.random.default_rng() # The generator used to place the special cells by default
+
+
+class Pattern:
+
+    def __init__(self, name: str, cells: list[tuple[int, int]], excluded: list[tuple[int, int]] = (), spawn: str = None, priority: int = 0) -> None:
+        '''Initializes a match pattern, anchored at its first cell
+
+        :param str name: the name of the pattern
+        :param list[tuple[int, int]] cells: the offsets (dx, dy) of the cells that must all be of the same normal type
+        :param list[tuple[int, int]] excluded: the offsets of the cells that must not be of that type, or outside of the grid
+        :param str spawn: the name of the special cell spawned on one of the matched cells, None if the pattern only removes its cells
+        :param int priority: a match is discarded when all its cells are part of a match of a pattern with a higher priority,
+            and the special cells of the patterns with a higher priority are placed last
+        '''
+        # The offsets are made relative to the first cell, which is the anchor of the matches
+        ax, ay = cells[0]
+        self.name = name
+        self.cells = [(x - ax, y - ay) for x, y in cells]
+        self.excluded = [(x - ax, y - ay) for x, y in excluded]
+        self.spawn = spawn
+        self.priority = priority
+
+
+    def orientations(self) -> list['Pattern']:
+        '''Returns the pattern in all its distinct rotations and reflections
+
+        :return list[Pattern]:
+        '''
+        patterns = []
+        seen = set()
+        for transform in (
+            lambda x, y: (x, y), lambda x, y: (-y, x), lambda x, y: (-x, -y), lambda x, y: (y, -x),
+            lambda x, y: (-x, y), lambda x, y: (y, x), lambda x, y: (x, -y), lambda x, y: (-y, -x)
+        ):
+            cells = [transform(*cell) for cell in self.cells]
+            excluded = [transform(*cell) for cell in self.excluded]
+            # Two orientations are the same shape when their cells match once shifted to the origin,
+            # whichever of their cells is the anchor
+            left, top = min(x for x, _ in cells), min(y for _, y in cells)
+            key = (frozenset((x - left, y - top) for x, y in cells), frozenset((x - left, y - top) for x, y in excluded))
+            if key not in seen:
+                seen.add(key)
+                patterns.append(Pattern(self.name, cells, excluded, self.spawn, self.priority))
+        return patterns
+
+
+
+def line(length: int, direction: tuple[int, int]) -> list[tuple[int, int]]:
+    '''Returns the offsets of a straight line
+
+    :param int length: the number of cells of the line
+    :param tuple[int, int] direction: the direction of the line
+    :return list[tuple[int, int]]:
+    '''
+    return [(direction[0] * i, direction[1] * i) for i in range(length)]
+
+
+def l_shape(arm: int = 3, spawn: str = None, priority: int = 1) -> list[Pattern]:
+    '''Returns the patterns of an L shape in all its orientations, made of two arms sharing their corner
+
+    :param int arm: the number of cells of each arm, corner included
+    :param str spawn: the name of the special cell spawned by the pattern
+    :param int priority: the priority of the pattern
+    :return list[Pattern]:
+    '''
+    return Pattern('L', line(arm, (1, 0)) + line(arm, (0, 1))[1:], spawn=spawn, priority=priority).orientations()
+
+
+def t_shape(arm: int = 3, spawn: str = None, priority: int = 1) -> list[Pattern]:
+    '''Returns the patterns of a T shape in all its orientations, made of a bar and a stem starting from its middle
+
+    :param int arm: the number of cells of the bar, which must be odd, and of the stem, middle cell included
+    :param str spawn: the name of the special cell spawned by the pattern
+    :param int priority: the priority of the pattern
+    :return list[Pattern]:
+    '''
+    bar = [(x - arm // 2, 0) for x in range(arm)]
+    return Pattern('T', bar + line(arm, (0, 1))[1:], spawn=spawn, priority=priority).orientations()
+
+
+def square(size: int = 2, spawn: str = None, priority: int = 1) -> list[Pattern]:
+    '''Returns the pattern of a square
+
+    :param int size: the number of cells of a side
+    :param str spawn: the name of the special cell spawned by the pattern
+    :param int priority: the priority of the pattern
+    :return list[Pattern]:
+    '''
+    return [Pattern('square', [(x, y) for y in range(size) for x in range(size)], spawn=spawn, priority=priority)]
+
+
+
+class PatternSet:
+
+    def __init__(self, patterns: list[Pattern]) -> None:
+        '''Compiles a list of patterns into offset tables, evaluated on the whole grid at once by match
+
+        :param list[Pattern] patterns: the patterns
+        '''
+        # Stable sort, so that the special cells of the patterns with a higher priority are placed last
+        self.patterns = sorted(patterns, key=lambda pattern: pattern.priority)
+        self.offsets = [numpy.array(pattern.cells) for pattern in self.patterns]
+
+        # For each pattern, the shifts at which a match of a pattern with a higher priority contains all its cells
+        self.suppressors: list[list[tuple[int, tuple[int, int]]]] = []
+        for pattern in self.patterns:
+            suppressors = []
+            cells = set(pattern.cells)
+            for j, other in enumerate(self.patterns):
+                if other.priority <= pattern.priority:
+                    continue
+                other_cells = set(other.cells)
+                for x, y in other.cells:
+                    shift = (x - pattern.cells[0][0], y - pattern.cells[0][1])
+                    if {(cx + shift[0], cy + shift[1]) for cx, cy in cells} <= other_cells:
+                        suppressors.append((j, shift))
+            self.suppressors.append(suppressors)
+
+        # The distance from a cell to the matches that can contain it, and to the cells they depend on
+        reach = max(
+            (max(abs(x), abs(y)) for pattern in self.patterns for x, y in pattern.cells + pattern.excluded),
+            default=0
+        )
+        self.margin = 2 * reach
+        self.halo = 3 * reach # Suppressing a match also depends on the matches overlapping it
+
+
+    def match(self, codes: numpy.ndarray, rng: numpy.random.Generator = None, anchor_rows: tuple[int, int] = None) -> tuple[numpy.ndarray, list[tuple[str, numpy.ndarray]]]:
+        '''Finds all the matches of the patterns on a grid of cell codes
+
+        :param numpy.ndarray codes: the cell codes, in the (height, width) shape
+        :param numpy.random.Generator rng: the generator used to choose the cell where each special cell spawns,
+            if None it spawns on the first cell of its pattern
+        :param tuple[int, int] anchor_rows: the range of rows whose matches spawn special cells, all the rows if None
+        :return tuple[numpy.ndarray, list[tuple[str, numpy.ndarray]]]:
+            - the mask of the matched cells, in the (height, width) shape
+            - the special cells to place, one entry per pattern spawning special cells in the placement order,
+              as their name and the flat indexes of their cells
+        '''
+        h, w = codes.shape
+        m = self.margin
+        # Outside of the grid, the cells are empty so they never match
+        padded = numpy.zeros((h + 2 * m, w + 2 * m), numpy.int16)
+        padded[m:m + h, m:m + w] = codes
+        anchors = (codes != EMPTY) & (codes < CROSS)
+
+        def shifted(array: numpy.ndarray, dx: int, dy: int) -> numpy.ndarray:
+            return array[m + dy:m + dy + h, m + dx:m + dx + w]
+
+        masks = []
+        for pattern in self.patterns:
+            mask = anchors.copy()
+            for dx, dy in pattern.cells[1:]:
+                mask &= shifted(padded, dx, dy) == codes
+            for dx, dy in pattern.excluded:
+                mask &= shifted(padded, dx, dy) != codes
+            masks.append(mask)
+
+        padded_masks = []
+        for mask in masks:
+            padded_mask = numpy.zeros((h + 2 * m, w + 2 * m), bool)
+            padded_mask[m:m + h, m:m + w] = mask
+            padded_masks.append(padded_mask)
+        for i, suppressors in enumerate(self.suppressors):
+            for j, (dx, dy) in suppressors:
+                masks[i] &= ~shifted(padded_masks[j], -dx, -dy)
+
+        matched = numpy.zeros((h + 2 * m, w + 2 * m), bool)
+        spawns = []
+        for pattern, offsets, mask in zip(self.patterns, self.offsets, masks):
+            for dx, dy in pattern.cells:
+                matched[m + dy:m + dy + h, m + dx:m + dx + w] |= mask
+            if pattern.spawn:
+                if anchor_rows is not None:
+                    mask = mask[anchor_rows[0]:anchor_rows[1]]
+                ys, xs = numpy.nonzero(mask)
+                if anchor_rows is not None:
+                    ys += anchor_rows[0]
+                choice = rng.integers(0, len(offsets), len(ys)) if rng is not None else numpy.zeros(len(ys), int)
+                spawns.append((pattern.spawn, numpy.unique((ys + offsets[choice, 1]) * w + xs + offsets[choice, 0])))
+
+        return matched[m:m + h, m:m + w], spawns
+
+
+
+# The rules of the game: every straight alignment of at least 3 cells is removed,
+# each cell starting an alignment of at least 5 cells spawns a rainbow cell,
+# and each cell starting an alignment of exactly 4 cells spawns a cross cell
+DEFAULT_PATTERNS = PatternSet(
+    [Pattern('line5', line(5, direction), spawn='rainbow') for direction in DIRECTIONS] +
+    [Pattern('line4', line(4, direction), excluded=[(direction[0] * 4, direction[1] * 4)], spawn='cross') for direction in DIRECTIONS] +
+    [Pattern('line3', line(3, direction)) for direction in DIRECTIONS]
+)
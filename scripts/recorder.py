@@ -0,0 +1,121 @@
+import os
+import queue
+import struct
+import threading
+import time
+
+import numpy
+import pygame
+
+
+
+RAW_FRAME_HEADER = struct.Struct('<HHd') # width, height and timestamp of each frame of a raw stream, followed by its RGB24 pixels
+
+
+class FrameRecorder:
+
+    def __init__(self, directory: str, output_format: str = 'raw', queue_size: int = 8) -> None:
+        '''Initializes the recorder and starts its writer thread
+        The frames are copied into a pool of reusable buffers, which are written to the disk by a background thread
+        When the queue starts filling up, the frames are captured at half resolution, and they are dropped when it is full
+
+        :param str directory: the directory where the recording is saved
+        :param str output_format: 'raw' to append all the frames to a single file, 'png' to save each frame as a PNG image
+            The files are named after the start time and the process id, so that each session has its own recording
+        :param int queue_size: the maximum number of frames waiting to be written
+        '''
+        if output_format not in ('raw', 'png'):
+            raise ValueError(f'Invalid recording format: {output_format}')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.output_format = output_format
+        self.frames = queue.Queue(queue_size)
+        self.free_buffers: dict[tuple[int, int], list[numpy.ndarray]] = {}
+        self.lock = threading.Lock()
+        self.captured_frames = 0
+        self.downscaled_frames = 0
+        self.dropped_frames = 0
+        self.written_frames = 0
+        self.name = f'recording_{int(time.time())}_{os.getpid()}'
+        self.raw_file = open(os.path.join(directory, f'{self.name}.rgb'), 'wb') if output_format == 'raw' else None
+        self.writer = threading.Thread(target=self.write_frames, daemon=True)
+        self.writer.start()
+
+
+    def get_buffer(self, width: int, height: int) -> numpy.ndarray:
+        '''Returns a free buffer of the given size, allocating it if none is available
+
+        :param int width: the width of the frame
+        :param int height: the height of the frame
+        :return numpy.ndarray: the buffer, in the (height, width, 3) shape
+        '''
+        with self.lock:
+            buffers = self.free_buffers.get((width, height))
+            if buffers:
+                return buffers.pop()
+        return numpy.empty((height, width, 3), numpy.uint8)
+
+
+    def release_buffer(self, buffer: numpy.ndarray) -> None:
+        '''Gives a buffer back to the pool once its frame has been written
+
+        :param numpy.ndarray buffer: the buffer
+        '''
+        with self.lock:
+            self.free_buffers.setdefault((buffer.shape[1], buffer.shape[0]), []).append(buffer)
+
+
+    def capture(self, screen: pygame.Surface) -> None:
+        '''Queues the current content of the screen, without blocking the game loop
+
+        :param pygame.Surface screen: the screen to capture
+        '''
+        if self.frames.full():
+            self.dropped_frames += 1
+            return
+
+        # Reference the pixels of the screen directly, and only copy them once into a pooled buffer
+        pixels = pygame.surfarray.pixels3d(screen)
+        if self.frames.qsize() >= self.frames.maxsize // 2:
+            pixels = pixels[::2, ::2]
+            self.downscaled_frames += 1
+        buffer = self.get_buffer(*pixels.shape[:2])
+        numpy.copyto(buffer, pixels.transpose(1, 0, 2))
+        del pixels # Unlock the screen
+
+        try:
+            self.frames.put_nowait((time.perf_counter(), buffer))
+            self.captured_frames += 1
+        except queue.Full:
+            self.release_buffer(buffer)
+            self.dropped_frames += 1
+
+
+    def write_frames(self) -> None:
+        '''Writes the queued frames to the disk until None is received, runs in the writer thread
+        '''
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                return
+            timestamp, buffer = frame
+            height, width = buffer.shape[:2]
+            if self.raw_file:
+                self.raw_file.write(RAW_FRAME_HEADER.pack(width, height, timestamp))
+                self.raw_file.write(memoryview(buffer).cast('B'))
+            else:
+                pygame.image.save(
+                    pygame.image.frombuffer(buffer, (width, height), 'RGB'),
+                    os.path.join(self.directory, f'{self.name}_{self.written_frames:06d}.png')
+                )
+            self.release_buffer(buffer)
+            self.written_frames += 1
+
+
+    def close(self) -> None:
+        '''Writes the remaining frames and stops the writer thread
+        '''
+        self.frames.put(None)
+        self.writer.join()
+        if self.raw_file:
+            self.raw_file.close()
@@ -15,14 +15,12 @@ def render_grid(screen: pygame.Surface, grid: list[list[tuple[str, pygame.Surfac
     :param int y: the y position of the grid
     :param int cell_size: the size of a cell
     '''
+    cell_background = texture_pack.scaled_interface(cell_size)['CELL_BACKGROUND']
     for i in range(len(grid)):
         for j in range(len(grid[i])):
 
             # Render the cell background
-            screen.blit(
-                pygame.transform.scale(texture_pack.CELL_BACKGROUND, (cell_size, cell_size)),
-                (x + j * cell_size, y + i * cell_size)
-            )
+            screen.blit(cell_background, (x + j * cell_size, y + i * cell_size))
             # Render the cell if there is one
             if grid[i][j][1] is not None:
                 screen.blit(grid[i][j][1], (x + j * cell_size, y + i * cell_size))
@@ -39,15 +37,13 @@ def render_score(screen: pygame.Surface, cells: list[C], objectives: list[int],
     :param int grid_margin: the grid's margin, in pixels
     :param int cell_size: the size of a cell
     '''
+    interface = texture_pack.scaled_interface(cell_size)
     for i in range(len(cells)):
         x = i * cell_size + grid_margin
         y = grid_margin // 2
 
         # Render the cell background
-        screen.blit(
-            pygame.transform.scale(texture_pack.SCORE_CELL_BACKGROUND, (cell_size, cell_size)),
-            (x, y)
-        )
+        screen.blit(interface['SCORE_CELL_BACKGROUND'], (x, y))
 
         # Compute the progression
         completion = min(scores[i] / objectives[i], 1)
@@ -62,10 +58,7 @@ def render_score(screen: pygame.Surface, cells: list[C], objectives: list[int],
         if completion == 1: # Render the cell first if enough have been obtained
             screen.blit(cells[i][1], (x, y))
             screen.blit(progression_rect, (x, y))
-            screen.blit(
-                pygame.transform.scale(texture_pack.CHECKMARK_ICON, (cell_size, cell_size)),
-                (x, y)
-            )
+            screen.blit(interface['CHECKMARK_ICON'], (x, y))
         else: # Render the cell last
             screen.blit(progression_rect, (x, y))
             screen.blit(cells[i][1], (x, y))
@@ -83,31 +76,77 @@ def render_selector(screen: pygame.Surface, selector_pos: tuple[int, int], textu
     :param tuple[int, int] grid_size: the size of the grid
     :param tuple[int, int] grid_margin: the margin of the grid in the format (<left margin>, <top margin>)
     '''
+    interface = texture_pack.scaled_interface(cell_size)
     screen.blit(
-        pygame.transform.scale(texture_pack.SELECTOR, (cell_size, cell_size)),
+        interface['SELECTOR'],
         (selector_pos[0] * cell_size + grid_margin[0], selector_pos[1] * cell_size + grid_margin[1])
     )
     for i, j in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
         x, y = selector_pos[0] + i, selector_pos[1] + j
         if x >= 0 and x < grid_size[0] and y >= 0 and y < grid_size[1]:
-            screen.blit(
-                pygame.transform.scale(texture_pack.SUBSELECTOR, (cell_size, cell_size)),
-                (x * cell_size + grid_margin[0], y * cell_size + grid_margin[1])
-            )
+            screen.blit(interface['SUBSELECTOR'], (x * cell_size + grid_margin[0], y * cell_size + grid_margin[1]))
 
 
-def resize_cells(cells: list[C], cell_size: int) -> list[C]:
-    '''Resizes all the cells to a new size
-    
-    :param list[C] cells: the cells to resize
-    :param int cell_size: the new size of the cells
-    :return list[C]: the resized cells
-    '''
-    c = []
-    for cell in cells:
-        name, sprite = cell
-        c.append((name, pygame.transform.scale(sprite, (cell_size, cell_size))))
-    return c
+class Display:
+
+    def __init__(self, logical_size: tuple[int, int], window_size: tuple[int, int], smooth_scaling: bool = True) -> None:
+        '''Opens a resizable window, and the backbuffer the game is rendered on
+        The backbuffer keeps its logical size whatever the size of the window, and is scaled to the window once per frame
+
+        :param tuple[int, int] logical_size: the size of the backbuffer, in pixels
+        :param tuple[int, int] window_size: the initial size of the window, in pixels
+        :param bool smooth_scaling: True to scale the backbuffer with smoothscale, False with the faster scale
+        '''
+        self.window = pygame.display.set_mode(window_size, pygame.RESIZABLE)
+        self.backbuffer = pygame.Surface(logical_size)
+        self.smooth_scaling = smooth_scaling
+
+
+    @property
+    def viewport(self) -> pygame.Rect:
+        '''Returns the area of the window where the backbuffer is displayed,
+        as large as possible while keeping its aspect ratio, and centered
+
+        :return pygame.Rect:
+        '''
+        window_width, window_height = self.window.get_size()
+        width, height = self.backbuffer.get_size()
+        scale = min(window_width / width, window_height / height)
+        viewport = pygame.Rect(0, 0, max(1, round(width * scale)), max(1, round(height * scale)))
+        viewport.center = (window_width // 2, window_height // 2)
+        return viewport
+
+
+    def present(self) -> None:
+        '''Scales the backbuffer to the window in a single pass and updates the display
+        '''
+        self.window = pygame.display.get_surface() # The window surface changes when it is resized
+        viewport = self.viewport
+        if viewport.size == self.backbuffer.get_size():
+            self.window.blit(self.backbuffer, viewport)
+        else:
+            if viewport.size != self.window.get_size():
+                self.window.fill((0, 0, 0))
+            # smoothscale only supports 24 and 32 bits surfaces
+            if self.smooth_scaling and self.window.get_bitsize() in (24, 32):
+                pygame.transform.smoothscale(self.backbuffer, viewport.size, self.window.subsurface(viewport))
+            else:
+                pygame.transform.scale(self.backbuffer, viewport.size, self.window.subsurface(viewport))
+        pygame.display.flip()
+
+
+    def to_logical(self, pos: tuple[int, int]) -> tuple[int, int]:
+        '''Converts a position in the window, such as the position of the mouse, to a position in the backbuffer
+
+        :param tuple[int, int] pos: the position in the window
+        :return tuple[int, int]: the position in the backbuffer, which can be outside of it
+        '''
+        viewport = self.viewport
+        width, height = self.backbuffer.get_size()
+        return (
+            (pos[0] - viewport.x) * width // viewport.width,
+            (pos[1] - viewport.y) * height // viewport.height
+        )
 
 
 
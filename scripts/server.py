@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import random
+import struct
+from array import array
+
+import scripts.board as board_logic
+
+
+
+# Every message is prefixed by its length, as an unsigned 32 bits integer
+# Requests start with an opcode and a session id, all the integers are big-endian
+NEW_SESSION = 1 # payload: width (H), height (H), seed (Q), objectives (I each) -> session id (I), board (w*h bytes)
+SWAP = 2 # payload: x (H), y (H), new_x (H), new_y (H) -> won (B), cascade depth (B), score deltas, changed cells
+STATE = 3 # no payload -> width (H), height (H), scores (I each), board (w*h bytes)
+CLOSE_SESSION = 4 # no payload -> nothing
+
+OK = 0
+UNKNOWN_SESSION = 1
+INVALID_MOVE = 2
+INVALID_REQUEST = 3
+
+HEADER = struct.Struct('!BI')
+LENGTH = struct.Struct('!I')
+NEW_SESSION_PAYLOAD = struct.Struct('!HHQ')
+SWAP_PAYLOAD = struct.Struct('!HHHH')
+SIZE = struct.Struct('!HH')
+
+
+
+class Session:
+
+    __slots__ = ('width', 'height', 'board', 'objectives', 'scores', 'rng', 'rainbow_cells_nb', 'cross_cells_nb')
+
+    def __init__(self, width: int, height: int, objectives: list[int], seed: int) -> None:
+        '''Initializes a game session with a filled board that does not contain any alignment
+
+        :param int width: the width of the board
+        :param int height: the height of the board
+        :param list[int] objectives: the list of objectives, where each element is the number of cells of the corresponding type that need to be obtained
+        :param int seed: the seed of the session's random generator
+        '''
+        self.width = width
+        self.height = height
+        self.objectives = array('I', objectives)
+        self.scores = array('I', [0] * len(objectives))
+        self.rng = random.Random(seed)
+        self.rainbow_cells_nb = 0
+        self.cross_cells_nb = 0
+        self.board = bytearray(width * height)
+        board_logic.resolve(self.board, width, height, len(objectives), self.rng, False, False)
+
+
+    @property
+    def has_won(self) -> bool:
+        '''Returns True if all the objectives have been completed, False otherwise
+
+        :return bool:
+        '''
+        return all(score >= objective for score, objective in zip(self.scores, self.objectives))
+
+
+    def swap(self, a: int, b: int, max_rainbow_cells: int, max_cross_cells: int) -> tuple[dict[int, int], int, list[int]]:
+        '''Plays a swap and resolves its cascade, the same way the game does
+
+        :param int a: the index of the first cell
+        :param int b: the index of the second cell
+        :param int max_rainbow_cells: the maximum number of rainbow cells on the board
+        :param int max_cross_cells: the maximum number of cross cells on the board
+        :return tuple[dict[int, int], int, list[int]]: the score delta per code, the depth of the cascade and the indexes of the changed cells
+        '''
+        old_board = bytes(self.board)
+        kind, removed = board_logic.play_swap(self.board, self.width, self.height, a, b)
+        if kind == 'rainbow':
+            self.rainbow_cells_nb -= 1
+        elif kind == 'cross':
+            self.cross_cells_nb -= 1
+
+        aligned_cells_count, rainbow_cells, cross_cells, depth = board_logic.resolve(
+            self.board, self.width, self.height, len(self.objectives), self.rng,
+            self.rainbow_cells_nb < max_rainbow_cells, self.cross_cells_nb < max_cross_cells
+        )
+        self.rainbow_cells_nb += rainbow_cells
+        self.cross_cells_nb += cross_cells
+
+        deltas = {}
+        for counts in (removed, aligned_cells_count):
+            for code, amount in counts.items():
+                if board_logic.is_normal(code) and code <= len(self.scores):
+                    deltas[code] = deltas.get(code, 0) + amount
+        for code, amount in deltas.items():
+            self.scores[code - 1] += amount
+
+        changed = [i for i, (old, new) in enumerate(zip(old_board, self.board)) if old != new]
+        return deltas, depth, changed
+
+
+
+class GameServer:
+
+    def __init__(self, max_rainbow_cells: int = 5, max_cross_cells: int = 5, max_sessions: int = 100000) -> None:
+        '''Initializes the game server
+
+        :param int max_rainbow_cells: the maximum number of rainbow cells on each board
+        :param int max_cross_cells: the maximum number of cross cells on each board
+        :param int max_sessions: the maximum number of sessions hosted at the same time
+        '''
+        self.max_rainbow_cells = max_rainbow_cells
+        self.max_cross_cells = max_cross_cells
+        self.max_sessions = max_sessions
+        self.sessions: dict[int, Session] = {}
+        self.next_session_id = 1
+
+
+    def handle_request(self, request: bytes) -> bytes:
+        '''Handles a request and returns the response, both without their length prefix
+
+        :param bytes request: the request
+        :return bytes: the response, starting with its status
+        '''
+        if len(request) < HEADER.size:
+            return bytes((INVALID_REQUEST,))
+        opcode, session_id = HEADER.unpack_from(request)
+        payload = request[HEADER.size:]
+
+        if opcode == NEW_SESSION:
+            if len(payload) < NEW_SESSION_PAYLOAD.size or (len(payload) - NEW_SESSION_PAYLOAD.size) % 4 \
+                or len(self.sessions) >= self.max_sessions:
+                return bytes((INVALID_REQUEST,))
+            width, height, seed = NEW_SESSION_PAYLOAD.unpack_from(payload)
+            objectives = struct.unpack_from(f'!{(len(payload) - NEW_SESSION_PAYLOAD.size) // 4}I', payload, NEW_SESSION_PAYLOAD.size)
+            if not width or not height or not 0 < len(objectives) < board_logic.CROSS:
+                return bytes((INVALID_REQUEST,))
+            session_id = self.next_session_id
+            self.next_session_id += 1
+            session = self.sessions[session_id] = Session(width, height, objectives, seed)
+            return bytes((OK,)) + LENGTH.pack(session_id) + session.board
+
+        session = self.sessions.get(session_id)
+        if session is None:
+            return bytes((UNKNOWN_SESSION,))
+
+        if opcode == SWAP:
+            if len(payload) != SWAP_PAYLOAD.size:
+                return bytes((INVALID_REQUEST,))
+            x, y, new_x, new_y = SWAP_PAYLOAD.unpack(payload)
+            if x >= session.width or new_x >= session.width or y >= session.height or new_y >= session.height \
+                or abs(x - new_x) + abs(y - new_y) != 1:
+                return bytes((INVALID_MOVE,))
+            deltas, depth, changed = session.swap(
+                y * session.width + x, new_y * session.width + new_x,
+                self.max_rainbow_cells, self.max_cross_cells
+            )
+            response = bytearray((OK, session.has_won, min(depth, 255), len(deltas)))
+            for code, amount in deltas.items():
+                response += struct.pack('!BI', code, amount)
+            response += LENGTH.pack(len(changed))
+            for i in changed:
+                response += struct.pack('!IB', i, session.board[i])
+            return bytes(response)
+
+        if opcode == STATE:
+            return bytes((OK,)) + SIZE.pack(session.width, session.height) \
+                + struct.pack(f'!{len(session.scores)}I', *session.scores) + session.board
+
+        if opcode == CLOSE_SESSION:
+            del self.sessions[session_id]
+            return bytes((OK,))
+
+        return bytes((INVALID_REQUEST,))
+
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''Answers the requests of a client until it disconnects
+
+        :param asyncio.StreamReader reader: the stream to read the requests from
+        :param asyncio.StreamWriter writer: the stream to write the responses to
+        '''
+        try:
+            while True:
+                length, = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+                response = self.handle_request(await reader.readexactly(length))
+                writer.write(LENGTH.pack(len(response)) + response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 5555, path: str = None) -> None:
+        '''Serves the clients forever, on a Unix socket if a path is given, on TCP otherwise
+
+        :param str host: the host to listen on
+        :param int port: the port to listen on
+        :param str path: the path of the Unix socket
+        '''
+        if path:
+            server = await asyncio.start_unix_server(self.handle_client, path)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Hosts many game sessions without any window')
+    parser.add_argument('--host', default='127.0.0.1', help='the host to listen on')
+    parser.add_argument('--port', type=int, default=5555, help='the port to listen on')
+    parser.add_argument('--unix', help='the path of a Unix socket to listen on instead of TCP')
+    parser.add_argument('--max-rainbow-cells', type=int, default=5, help='the maximum number of rainbow cells on each board')
+    parser.add_argument('--max-cross-cells', type=int, default=5, help='the maximum number of cross cells on each board')
+    parser.add_argument('--max-sessions', type=int, default=100000, help='the maximum number of sessions hosted at the same time')
+    args = parser.parse_args()
+
+    server = GameServer(args.max_rainbow_cells, args.max_cross_cells, args.max_sessions)
+    asyncio.run(server.serve(args.host, args.port, args.unix))
@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+import queue
+import struct
+import threading
+import time
+
+
+
+# Every record is a header (event type, payload length, timestamp) followed by its payload, all little-endian
+HEADER = struct.Struct('<BHd')
+SESSION = 1 # session id (Q), followed by the configuration id in UTF-8, written at the start of every file
+MOVE = 2 # x (H), y (H), new_x (H), new_y (H), kind (B), cascade depth (H), rainbow and cross cells added (H each), colours (B), cleared cells per colour (I each)
+FRAMES = 3 # number of frames (I), mean and maximum frame time in milliseconds (f each), since the previous FRAMES record
+WIN = 4 # time to win in seconds (d), number of moves (I)
+
+SESSION_PAYLOAD = struct.Struct('<Q')
+MOVE_PAYLOAD = struct.Struct('<HHHHBHHHB')
+FRAMES_PAYLOAD = struct.Struct('<Iff')
+WIN_PAYLOAD = struct.Struct('<dI')
+
+MOVE_KINDS = ['swap', 'rainbow', 'cross']
+
+
+class TelemetryLog:
+
+    def __init__(self, directory: str, session_record: bytes, max_file_size: int = 64 * 1024 * 1024, flush_interval: float = 1.) -> None:
+        '''Initializes the log and starts its writer thread
+        The records are buffered and written by a background thread, in files rotated when they exceed their maximum size
+
+        :param str directory: the directory of the log files
+        :param bytes session_record: the record written at the start of every file, identifying the session
+        :param int max_file_size: the size above which a new file is started, in bytes
+        :param float flush_interval: the maximum time a record stays in the buffer, in seconds
+        '''
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.session_record = session_record
+        self.max_file_size = max_file_size
+        self.flush_interval = flush_interval
+        self.records = queue.SimpleQueue()
+        self.file = None
+        self.file_index = 0
+        self.writer = threading.Thread(target=self.write_records, daemon=True)
+        self.writer.start()
+
+
+    def emit(self, event_type: int, payload: bytes) -> None:
+        '''Adds a record to the log, without blocking
+
+        :param int event_type: the type of the event
+        :param bytes payload: the payload of the record
+        '''
+        self.records.put(HEADER.pack(event_type, len(payload), time.time()) + payload)
+
+
+    def open_file(self) -> None:
+        '''Starts a new file, beginning with the session record
+        '''
+        if self.file:
+            self.file.close()
+        name = f'telemetry_{int(time.time())}_{os.getpid()}_{self.file_index:04d}.bin'
+        self.file = open(os.path.join(self.directory, name), 'ab')
+        self.file.write(self.session_record)
+        self.file_index += 1
+
+
+    def write_records(self) -> None:
+        '''Writes the buffered records in batches until None is received, runs in the writer thread
+        '''
+        self.open_file()
+        running = True
+        while running:
+            try:
+                batch = [self.records.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while not self.records.empty():
+                batch.append(self.records.get())
+            if batch[-1] is None:
+                batch.pop()
+                running = False
+
+            for record in batch:
+                if self.file.tell() + len(record) > self.max_file_size:
+                    self.open_file()
+                self.file.write(record)
+            self.file.flush()
+        self.file.close()
+
+
+    def close(self) -> None:
+        '''Writes the remaining records and stops the writer thread
+        '''
+        self.records.put(None)
+        self.writer.join()
+
+
+
+class SessionTelemetry:
+
+    def __init__(self, directory: str, config_id: str, cells: list[str], max_file_size: int = 64 * 1024 * 1024) -> None:
+        '''Initializes the telemetry of a game session
+
+        :param str directory: the directory of the log files
+        :param str config_id: the identifier of the game configuration, the statistics are aggregated per configuration
+        :param list[str] cells: the names of the normal cells, in the order of the scores
+        :param int max_file_size: the size above which a new file is started, in bytes
+        '''
+        self.cells = cells
+        self.start_time = None # Set once the grid is first stable, so the startup is not part of the time to win
+        self.moves = 0
+        self.move = None
+        self.frame_times = []
+        self.has_won = False
+        payload = SESSION_PAYLOAD.pack(int.from_bytes(os.urandom(8), 'little')) + config_id.encode()
+        self.log = TelemetryLog(directory, HEADER.pack(SESSION, len(payload), time.time()) + payload, max_file_size)
+
+
+    def start_move(self, pos: tuple[int, int], new_pos: tuple[int, int], kind: str, aligned_cells: dict[str, int] = None) -> None:
+        '''Starts recording a move of the player
+
+        :param tuple[int, int] pos: the position of the first cell
+        :param tuple[int, int] new_pos: the position of the second cell
+        :param str kind: the kind of the move, 'swap', 'rainbow' or 'cross'
+        :param dict[str, int] aligned_cells: the number of cells removed by the move itself, per type
+        '''
+        if self.move is not None: # The previous move is still cascading, it is written as it is so far
+            self.end_move()
+        self.move = {'pos': pos + new_pos, 'kind': MOVE_KINDS.index(kind), 'depth': 0, 'rainbow': 0, 'cross': 0, 'cleared': [0] * len(self.cells)}
+        self.add_cleared_cells(aligned_cells or {})
+
+
+    def add_cleared_cells(self, aligned_cells: dict[str, int]) -> None:
+        '''Adds removed cells to the current move
+
+        :param dict[str, int] aligned_cells: the number of removed cells per type
+        '''
+        for name, amount in aligned_cells.items():
+            if name in self.cells:
+                self.move['cleared'][self.cells.index(name)] += amount
+
+
+    def add_cascade(self, aligned_cells: dict[str, int], rainbow_cells: int, cross_cells: int) -> None:
+        '''Adds a step of the cascade to the current move, if there is one
+
+        :param dict[str, int] aligned_cells: the number of aligned cells per type
+        :param int rainbow_cells: the number of rainbow cells added
+        :param int cross_cells: the number of cross cells added
+        '''
+        if self.move is None or not aligned_cells:
+            return
+        self.move['depth'] += 1
+        self.move['rainbow'] += rainbow_cells
+        self.move['cross'] += cross_cells
+        self.add_cleared_cells(aligned_cells)
+
+
+    def end_move(self) -> None:
+        '''Writes the current move, once its cascade is over, along with the frame times since the previous move
+        The first call, once the initial grid is stable, starts the clock of the time to win
+        '''
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        if self.move is not None:
+            move = self.move
+            payload = MOVE_PAYLOAD.pack(*move['pos'], move['kind'], move['depth'], move['rainbow'], move['cross'], len(self.cells))
+            self.log.emit(MOVE, payload + struct.pack(f'<{len(self.cells)}I', *move['cleared']))
+            self.moves += 1
+            self.move = None
+        if self.frame_times:
+            self.log.emit(FRAMES, FRAMES_PAYLOAD.pack(
+                len(self.frame_times), sum(self.frame_times) / len(self.frame_times), max(self.frame_times)
+            ))
+            self.frame_times = []
+
+
+    def add_frame(self, frame_time: float) -> None:
+        '''Records the duration of a frame
+
+        :param float frame_time: the duration of the frame, in milliseconds
+        '''
+        self.frame_times.append(frame_time)
+
+
+    def win(self) -> None:
+        '''Records the end of the game, only the first call is taken into account
+        '''
+        if not self.has_won:
+            self.has_won = True
+            self.end_move()
+            self.log.emit(WIN, WIN_PAYLOAD.pack(time.perf_counter() - self.start_time, self.moves))
+
+
+    def close(self) -> None:
+        '''Writes the remaining records
+        '''
+        self.end_move()
+        self.log.close()
+
+
+
+def read_records(path: str, buffer_size: int = 1024 * 1024):
+    '''Reads the records of a log file one by one, without loading the whole file
+
+    :param str path: the path of the file
+    :param int buffer_size: the size of the read buffer, in bytes
+    :return Generator[tuple[int, float, bytes]]: the event type, the timestamp and the payload of each record
+    '''
+    with open(path, 'rb', buffering=buffer_size) as file:
+        while True:
+            header = file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return # End of the file, or a record cut by a crash
+            event_type, length, timestamp = HEADER.unpack(header)
+            payload = file.read(length)
+            if len(payload) < length:
+                return
+            yield event_type, timestamp, payload
+
+
+def aggregate(paths: list[str]) -> dict[str, dict]:
+    '''Aggregates the records of log files into statistics per configuration
+
+    :param list[str] paths: the paths of the files
+    :return dict[str, dict]: the statistics of each configuration
+    '''
+    statistics = {}
+    for path in paths:
+        stats = None
+        for event_type, _, payload in read_records(path):
+            if event_type == SESSION:
+                session_id, = SESSION_PAYLOAD.unpack_from(payload)
+                config_id = payload[SESSION_PAYLOAD.size:].decode()
+                stats = statistics.setdefault(config_id, {
+                    'sessions': set(), 'moves': 0, 'moves_per_kind': [0] * len(MOVE_KINDS), 'cleared_cells': [],
+                    'cascade_depth_total': 0, 'max_cascade_depth': 0, 'rainbow_cells_added': 0, 'cross_cells_added': 0,
+                    'frames': 0, 'frame_time_total': 0., 'max_frame_time': 0., 'wins': 0, 'time_to_win_total': 0., 'moves_to_win_total': 0
+                })
+                stats['sessions'].add(session_id)
+            elif stats is None:
+                continue # The file does not start with a session record
+            elif event_type == MOVE:
+                *_, kind, depth, rainbow_cells, cross_cells, colours = MOVE_PAYLOAD.unpack_from(payload)
+                cleared = struct.unpack_from(f'<{colours}I', payload, MOVE_PAYLOAD.size)
+                if len(stats['cleared_cells']) < colours:
+                    stats['cleared_cells'] += [0] * (colours - len(stats['cleared_cells']))
+                for i, amount in enumerate(cleared):
+                    stats['cleared_cells'][i] += amount
+                stats['moves'] += 1
+                stats['moves_per_kind'][kind] += 1
+                stats['cascade_depth_total'] += depth
+                stats['max_cascade_depth'] = max(stats['max_cascade_depth'], depth)
+                stats['rainbow_cells_added'] += rainbow_cells
+                stats['cross_cells_added'] += cross_cells
+            elif event_type == FRAMES:
+                frames, mean, maximum = FRAMES_PAYLOAD.unpack(payload)
+                stats['frames'] += frames
+                stats['frame_time_total'] += mean * frames
+                stats['max_frame_time'] = max(stats['max_frame_time'], maximum)
+            elif event_type == WIN:
+                time_to_win, moves = WIN_PAYLOAD.unpack(payload)
+                stats['wins'] += 1
+                stats['time_to_win_total'] += time_to_win
+                stats['moves_to_win_total'] += moves
+
+    return {
+        config_id: {
+            'sessions': len(stats['sessions']),
+            'moves': stats['moves'],
+            'moves_per_kind': dict(zip(MOVE_KINDS, stats['moves_per_kind'])),
+            'cleared_cells': stats['cleared_cells'],
+            'mean_cascade_depth': stats['cascade_depth_total'] / stats['moves'] if stats['moves'] else 0,
+            'max_cascade_depth': stats['max_cascade_depth'],
+            'rainbow_cells_added': stats['rainbow_cells_added'],
+            'cross_cells_added': stats['cross_cells_added'],
+            'mean_frame_time': stats['frame_time_total'] / stats['frames'] if stats['frames'] else 0,
+            'max_frame_time': stats['max_frame_time'],
+            'wins': stats['wins'],
+            'mean_time_to_win': stats['time_to_win_total'] / stats['wins'] if stats['wins'] else None,
+            'mean_moves_to_win': stats['moves_to_win_total'] / stats['wins'] if stats['wins'] else None
+        }
+        for config_id, stats in statistics.items()
+    }
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Aggregates telemetry logs into statistics per game configuration')
+    parser.add_argument('paths', nargs='+', help='the log files, or directories containing them')
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.bin')))
+        else:
+            files.append(path)
+    print(json.dumps(aggregate(files), indent=4))
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pygame
+
+from scripts.game_logic import G, C
+from scripts.history import History
+import scripts.assets as assets
+import scripts.renderer as renderer
+
+
+
+def save_board(path: str, g: G, scores: list[int] = None, objectives: list[int] = None) -> None:
+    '''Saves a grid as a JSON file, only keeping the name of each cell
+
+    :param str path: the path of the file
+    :param G g: the grid to save
+    :param list[int] scores: the list of scores
+    :param list[int] objectives: the list of objectives
+    '''
+    with open(path, 'w') as file:
+        json.dump({
+            'grid': [[cell[0] for cell in row] for row in g],
+            'scores': scores,
+            'objectives': objectives
+        }, file)
+
+
+def load_board(path: str) -> tuple[list[list[str]], list[int] | None, list[int] | None]:
+    '''Loads a board saved by save_board
+
+    :param str path: the path of the file
+    :return tuple[list[list[str]], list[int] | None, list[int] | None]: the names of the cells, the scores and the objectives
+    '''
+    with open(path) as file:
+        board = json.load(file)
+    return board['grid'], board.get('scores'), board.get('objectives')
+
+
+def save_checkpoints(path: str, history: History, objectives: list[int] = None) -> None:
+    '''Saves all the states of an undo/redo history as checkpoints, in a JSON lines file with one board per line
+
+    :param str path: the path of the file
+    :param History history: the history to save
+    :param list[int] objectives: the list of objectives
+    '''
+    with open(path, 'w') as file:
+        for snapshot in history.snapshots:
+            grid, scores, _, _ = snapshot.restore()
+            file.write(json.dumps({
+                'grid': [[cell[0] for cell in row] for row in grid],
+                'scores': scores,
+                'objectives': objectives
+            }) + '\n')
+
+
+def load_checkpoints(path: str) -> list[tuple[list[list[str]], list[int] | None, list[int] | None]]:
+    '''Loads the checkpoints saved by save_checkpoints
+
+    :param str path: the path of the file
+    :return list[tuple[list[list[str]], list[int] | None, list[int] | None]]: the names of the cells, the scores and the objectives of each checkpoint
+    '''
+    checkpoints = []
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                board = json.loads(line)
+                checkpoints.append((board['grid'], board.get('scores'), board.get('objectives')))
+    return checkpoints
+
+
+def list_boards(paths: list[str]) -> list[tuple[str, int | None]]:
+    '''Lists the boards to render: each board file, and each checkpoint of the checkpoint files (.jsonl)
+
+    :param list[str] paths: the paths of the files
+    :return list[tuple[str, int | None]]: the path of each board, and the index of the checkpoint in its file, None for a board file
+    '''
+    boards = []
+    for path in paths:
+        if path.endswith('.jsonl'):
+            with open(path) as file:
+                boards.extend((path, i) for i in range(sum(1 for line in file if line.strip())))
+        else:
+            boards.append((path, None))
+    return boards
+
+
+
+# State of each worker process, loaded once by init_worker
+TEXTURE_PACK: assets.TexturePack
+CELLS: list[C]
+CELL_TYPES: dict[str, C]
+CELL_SIZE: int
+BACKGROUNDS: dict[tuple[int, int], pygame.Surface] # The background scaled to each board size, most boards share the same size
+
+
+def init_worker(texture_pack: str, cell_size: int) -> None:
+    '''Initializes a worker process: starts pygame without any window and loads the texture pack once
+
+    :param str texture_pack: the path to the texture pack
+    :param int cell_size: the size of a cell, in pixels
+    '''
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    pygame.init()
+    global TEXTURE_PACK, CELLS, CELL_TYPES, CELL_SIZE, BACKGROUNDS
+    TEXTURE_PACK = assets.TexturePack(texture_pack)
+    BACKGROUNDS = {}
+    CELL_SIZE = cell_size
+    CELLS, rainbow_cell, cross_cell = TEXTURE_PACK.scaled_cells(cell_size)
+    CELL_TYPES = {cell[0]: cell for cell in CELLS + [rainbow_cell, cross_cell]}
+
+
+def render_board(names: list[list[str]], scores: list[int] = None, objectives: list[int] = None) -> pygame.Surface:
+    '''Renders a board off-screen the same way the game does
+
+    :param list[list[str]] names: the names of the cells
+    :param list[int] scores: the list of scores, the score is not rendered if None
+    :param list[int] objectives: the list of objectives
+    :return pygame.Surface: the rendered board
+    '''
+    grid_margin = CELL_SIZE
+    size = (
+        grid_margin * 2 + CELL_SIZE * len(names[0]),
+        grid_margin * 2 + CELL_SIZE * len(names) + CELL_SIZE
+    )
+    if size not in BACKGROUNDS:
+        BACKGROUNDS[size] = pygame.transform.scale(TEXTURE_PACK.BACKGROUND_IMAGE, size)
+    surface = pygame.Surface(size)
+    surface.blit(BACKGROUNDS[size], (0, 0))
+    renderer.render_grid(
+        screen=surface,
+        grid=[[CELL_TYPES.get(name, (None, None)) for name in row] for row in names],
+        texture_pack=TEXTURE_PACK,
+        x=grid_margin,
+        y=grid_margin + CELL_SIZE,
+        cell_size=CELL_SIZE
+    )
+    if scores is not None:
+        renderer.render_score(
+            screen=surface,
+            cells=CELLS,
+            objectives=objectives or [1] * len(CELLS),
+            scores=scores,
+            texture_pack=TEXTURE_PACK,
+            grid_margin=grid_margin,
+            cell_size=CELL_SIZE
+        )
+    return surface
+
+
+def render_sheet(boards: list[tuple[str, int | None]], output: str, sheet_index: int, thumbnail_width: int, columns: int) -> str:
+    '''Renders the thumbnails of some boards and the contact sheet gathering them, runs in a worker process
+    The thumbnails are named after their sheet and their position in it, so that boards with the same file name do not overwrite each other
+
+    :param list[tuple[str, int | None]] boards: the boards, as returned by list_boards
+    :param str output: the directory where the images are saved
+    :param int sheet_index: the index of the contact sheet
+    :param int thumbnail_width: the width of a thumbnail, in pixels
+    :param int columns: the number of thumbnails per row of the contact sheet
+    :return str: the path of the contact sheet
+    '''
+    checkpoints = {} # Each checkpoint file is only read once
+    thumbnails = []
+    for position, (path, index) in enumerate(boards):
+        if index is None:
+            board = load_board(path)
+        else:
+            if path not in checkpoints:
+                checkpoints[path] = load_checkpoints(path)
+            board = checkpoints[path][index]
+        surface = render_board(*board)
+        height = surface.get_height() * thumbnail_width // surface.get_width()
+        thumbnail = pygame.transform.smoothscale(surface, (thumbnail_width, height))
+        name = os.path.splitext(os.path.basename(path))[0] + (f'_{index:04d}' if index is not None else '')
+        pygame.image.save(thumbnail, os.path.join(output, f'sheet_{sheet_index:04d}_{position:03d}_{name}.png'))
+        thumbnails.append(thumbnail)
+
+    height = max(thumbnail.get_height() for thumbnail in thumbnails)
+    rows = (len(thumbnails) + columns - 1) // columns
+    sheet = pygame.Surface((columns * thumbnail_width, rows * height))
+    for i, thumbnail in enumerate(thumbnails):
+        sheet.blit(thumbnail, ((i % columns) * thumbnail_width, (i // columns) * height))
+    sheet_path = os.path.join(output, f'sheet_{sheet_index:04d}.png')
+    pygame.image.save(sheet, sheet_path)
+    return sheet_path
+
+
+def render_all(paths: list[str], output: str, texture_pack: str, cell_size: int = 32, thumbnail_width: int = 256, columns: int = 8, rows: int = 8, processes: int = None) -> list[str]:
+    '''Renders the thumbnails and the contact sheets of many boards on a process pool
+
+    :param list[str] paths: the paths of the board files and of the checkpoint files (.jsonl)
+    :param str output: the directory where the images are saved
+    :param str texture_pack: the path to the texture pack
+    :param int cell_size: the size of a cell when rendering a board, in pixels
+    :param int thumbnail_width: the width of a thumbnail, in pixels
+    :param int columns: the number of thumbnails per row of a contact sheet
+    :param int rows: the number of rows of a contact sheet
+    :param int processes: the number of worker processes, None uses all the cores
+    :return list[str]: the paths of the contact sheets
+    '''
+    os.makedirs(output, exist_ok=True)
+    boards = list_boards(paths)
+    per_sheet = columns * rows
+    sheets = [boards[i:i + per_sheet] for i in range(0, len(boards), per_sheet)]
+    with ProcessPoolExecutor(processes, initializer=init_worker, initargs=(texture_pack, cell_size)) as executor:
+        return list(executor.map(
+            render_sheet,
+            sheets,
+            [output] * len(sheets),
+            range(len(sheets)),
+            [thumbnail_width] * len(sheets),
+            [columns] * len(sheets)
+        ))
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Renders saved boards into PNG thumbnails and contact sheets')
+    parser.add_argument('boards', nargs='+', help='the JSON files of the boards, as written by save_board, or the JSON lines files of checkpoints, as written by save_checkpoints')
+    parser.add_argument('--output', default='thumbnails', help='the directory where the images are saved')
+    parser.add_argument('--texture-pack', default='CandyTexturePack', help='the name of the texture pack')
+    parser.add_argument('--cell-size', type=int, default=32, help='the size of a cell when rendering a board, in pixels')
+    parser.add_argument('--thumbnail-width', type=int, default=256, help='the width of a thumbnail, in pixels')
+    parser.add_argument('--columns', type=int, default=8, help='the number of thumbnails per row of a contact sheet')
+    parser.add_argument('--rows', type=int, default=8, help='the number of rows of a contact sheet')
+    parser.add_argument('--processes', type=int, help='the number of worker processes, all the cores by default')
+    args = parser.parse_args()
+
+    sheets = render_all(
+        paths=args.boards,
+        output=args.output,
+        texture_pack=f'assets/{args.texture_pack}',
+        cell_size=args.cell_size,
+        thumbnail_width=args.thumbnail_width,
+        columns=args.columns,
+        rows=args.rows,
+        processes=args.processes
+    )
+    print(f'{len(list_boards(args.boards))} boards rendered into {len(sheets)} contact sheets in {args.output}')
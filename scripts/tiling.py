@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+from scripts.patterns import PatternSet
+
+
+
+# The thread pools, shared by all the calls using the same number of workers
+# The numpy kernels release the GIL, so the tiles are processed in parallel
+EXECUTORS: dict[int, ThreadPoolExecutor] = {}
+
+
+def get_executor(workers: int) -> ThreadPoolExecutor:
+    '''Returns the thread pool with the given number of workers, creating it the first time
+
+    :param int workers: the number of threads
+    :return ThreadPoolExecutor:
+    '''
+    if workers not in EXECUTORS:
+        EXECUTORS[workers] = ThreadPoolExecutor(workers)
+    return EXECUTORS[workers]
+
+
+def match_tiled(patterns: PatternSet, codes: numpy.ndarray, rng: numpy.random.Generator = None, workers: int = 1, tile_rows: int = 256) -> tuple[numpy.ndarray, list[tuple[str, numpy.ndarray]]]:
+    '''Finds all the matches of the patterns like PatternSet.match, by splitting the grid into tiles of rows
+    Each tile is extended by the halo of the patterns, so that the matches crossing its edges are found,
+    and only spawns the special cells of the matches anchored in its own rows
+
+    :param PatternSet patterns: the match patterns
+    :param numpy.ndarray codes: the cell codes, in the (height, width) shape
+    :param numpy.random.Generator rng: the generator used to choose the cell where each special cell spawns
+    :param int workers: the number of threads, the grid is not split if it is 1
+    :param int tile_rows: the number of rows of a tile
+    :return tuple[numpy.ndarray, list[tuple[str, numpy.ndarray]]]: see PatternSet.match
+    '''
+    h, w = codes.shape
+    if workers <= 1 or h <= tile_rows:
+        return patterns.match(codes, rng)
+
+    tiles = [(top, min(top + tile_rows, h)) for top in range(0, h, tile_rows)]
+    rngs = rng.spawn(len(tiles)) if rng is not None else [None] * len(tiles)
+
+    def match_tile(tile: tuple[int, int], tile_rng: numpy.random.Generator) -> tuple[numpy.ndarray, list[tuple[str, numpy.ndarray]]]:
+        top, bottom = tile
+        start, end = max(top - patterns.halo, 0), min(bottom + patterns.halo, h)
+        aligned, spawns = patterns.match(codes[start:end], tile_rng, (top - start, bottom - start))
+        return aligned[top - start:bottom - start], [(name, indexes + start * w) for name, indexes in spawns]
+
+    results = list(get_executor(workers).map(match_tile, tiles, rngs))
+    aligned = numpy.concatenate([result[0] for result in results])
+    # Every tile returns one entry per spawning pattern, in the same order
+    spawns = [
+        (entries[0][0], numpy.unique(numpy.concatenate([indexes for _, indexes in entries])))
+        for entries in zip(*(result[1] for result in results))
+    ]
+    return aligned, spawns
+
+
+def gravity(filled: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    '''Computes where the cells fall when the holes are filled from the top
+
+    :param numpy.ndarray filled: the mask of the cells that are not empty, in the (height, width) shape
+    :return tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        - the rows of the cells that move
+        - their columns
+        - their new rows
+        - the number of holes at the top of each column once the cells have fallen
+    '''
+    h = filled.shape[0]
+    # The new row of a cell is given by the number of cells under it
+    below = numpy.cumsum(filled[::-1], axis=0)[::-1]
+    destinations = h - below
+    moved = filled & (destinations != numpy.arange(h)[:, None])
+    ys, xs = numpy.nonzero(moved)
+    return ys, xs, destinations[ys, xs], h - below[0]
+
+
+def gravity_tiled(filled: numpy.ndarray, workers: int = 1, tile_columns: int = 256) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    '''Computes the gravity like the gravity function, by splitting the grid into tiles of columns
+    The columns are independent, so the tiles do not need any halo
+
+    :param numpy.ndarray filled: the mask of the cells that are not empty, in the (height, width) shape
+    :param int workers: the number of threads, the grid is not split if it is 1
+    :param int tile_columns: the number of columns of a tile
+    :return tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]: see gravity
+    '''
+    w = filled.shape[1]
+    if workers <= 1 or w <= tile_columns:
+        return gravity(filled)
+
+    def gravity_tile(left: int) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        ys, xs, destinations, holes = gravity(filled[:, left:left + tile_columns])
+        return ys, xs + left, destinations, holes
+
+    results = list(get_executor(workers).map(gravity_tile, range(0, w, tile_columns)))
+    return tuple(numpy.concatenate([result[i] for result in results]) for i in range(4))
+